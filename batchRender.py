@@ -0,0 +1,201 @@
+"""
+Renders many compositions to midi-files (and optionally audio) in a pool of processes.
+
+A composition is a Python script that defines a Composition named `composition` and optionally `bmp`.
+Inputs are directories (all *.py scripts in them) or JSON manifests: a list of script paths
+or of objects of the form {"path": ..., "name": ..., "bmp": ...} (paths relative to the manifest).
+
+    python batchRender.py songs/ --out build/
+    python batchRender.py manifest.json --out build/ --audio --sound-font FluidR3_GM.sf2 --processes 8
+
+Outputs that are newer than their scripts are skipped. Names of outputs must be unique:
+a composition with the name of a previous one fails.
+"""
+import argparse
+import glob
+import json
+import os
+import runpy
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Iterable, Iterator, List
+
+from composition import Composition
+from midiWriter import write_tracks
+
+
+class Job:
+    """
+    One composition to render.
+    """
+
+    def __init__(self, script: str, name: str, bmp: float = None):
+        """
+        :param script: The path to the script of the composition.
+        :param name: Name of output files.
+        :param bmp: Number of metronome beats per minute. If None, then bmp of the script or the default.
+        """
+        self.script = script
+        self.name = name
+        self.bmp = bmp
+
+
+def read_jobs(inputs: Iterable[str]) -> Iterator[Job]:
+    """
+    Lazily lists compositions of directories and manifests.
+
+    :param inputs: Paths to directories or JSON manifests.
+    :return: Iterator of jobs.
+    """
+    for path in inputs:
+        if os.path.isdir(path):
+            for script in sorted(glob.glob(os.path.join(path, "*.py"))):
+                yield Job(script, os.path.splitext(os.path.basename(script))[0])
+            continue
+
+        with open(path) as file:
+            entries = json.load(file)
+        root = os.path.dirname(os.path.abspath(path))
+        for entry in entries:
+            if isinstance(entry, str):
+                entry = {"path": entry}
+            script = os.path.join(root, entry["path"])
+            yield Job(script, entry.get("name", os.path.splitext(os.path.basename(script))[0]), entry.get("bmp"))
+
+
+def outputs(job: Job, directory: str, audio: bool) -> List[str]:
+    """
+    :return: Paths to output files of the job.
+    """
+    paths = [os.path.join(directory, job.name + ".midi")]
+    if audio:
+        paths.append(os.path.join(directory, job.name + ".wav"))
+    return paths
+
+
+def up_to_date(job: Job, directory: str, audio: bool) -> bool:
+    """
+    :return: True if all outputs of the job exist and are newer than its script.
+    """
+    try:
+        modified = os.path.getmtime(job.script)
+        return all(os.path.getmtime(path) >= modified for path in outputs(job, directory, audio))
+    except OSError:
+        return False
+
+
+def render_job(job: Job, directory: str, bmp: float = 120, ticks_per_beat: int = 480, sound_font: str = None,
+               sample_rate: int = 44100) -> int:
+    """
+    Runs the script of the composition and writes its outputs. Runs in a worker process.
+
+    :param job: The job.
+    :param directory: The directory for outputs.
+    :param bmp: Number of metronome beats per minute if neither the job nor the script sets it.
+    :param ticks_per_beat: Number of ticks per beat of midi-files.
+    :param sound_font: The path to the sound font. If set, then audio is rendered too.
+    :param sample_rate: Number of samples per second of audio.
+    :return: Number of compiled events.
+    """
+    namespace = runpy.run_path(job.script, run_name="__render__")
+    composition = namespace.get("composition")
+    if not isinstance(composition, Composition):
+        raise ValueError("{} does not define a Composition named composition.".format(job.script))
+    # The tempo map is written as set_tempo events, so the midi-file plays at the same tempo as the audio.
+    tempo = composition.tempo_map(job.bmp or namespace.get("bmp", bmp))
+
+    tracks = composition.compile_events()
+    write_tracks(tracks, directory, tempo, ticks_per_beat=ticks_per_beat, single_file=True, name=job.name)
+    if sound_font is not None:
+        from synth import render
+        render(tracks, tempo, sound_font, path=os.path.join(directory, job.name + ".wav"), sample_rate=sample_rate)
+    return sum(len(track.events) for track in tracks)
+
+
+def render_all(jobs: Iterable[Job], directory: str, processes: int = None, queue_size: int = None,
+               force: bool = False, **kwargs) -> dict:
+    """
+    Renders jobs in a pool of processes. At most queue_size jobs are submitted at once,
+    so a long list of jobs does not fill the memory.
+
+    :param jobs: Jobs (can be a lazy iterator).
+    :param directory: The directory for outputs.
+    :param processes: Number of processes (None - number of processors).
+    :param queue_size: Maximum number of submitted jobs (None - twice the number of processes).
+    :param force: Render up-to-date outputs again or not.
+    :param kwargs: Other arguments of render_job.
+    :return: Summary of the form: {"rendered": ..., "skipped": ..., "failed": {script: error}, "events": ...,
+             "time": seconds}.
+    """
+    os.makedirs(directory, exist_ok=True)
+    audio = kwargs.get("sound_font") is not None
+    summary = {"rendered": 0, "skipped": 0, "failed": {}, "events": 0, "time": 0.0}
+    start = time.perf_counter()
+
+    queue_size = queue_size or 2 * (processes or os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        pending = {}
+
+        def collect(done):
+            for future in done:
+                job = pending.pop(future)
+                try:
+                    summary["events"] += future.result()
+                    summary["rendered"] += 1
+                except Exception as error:
+                    summary["failed"][job.script] = "{}: {}".format(type(error).__name__, error)
+
+        # Dictionary of the form: {name of outputs: script}
+        names = {}
+        for job in jobs:
+            if job.name in names:
+                # Otherwise the outputs of both scripts would be written to the same files.
+                summary["failed"][job.script] = "ValueError: The name {} is already used by {}.".format(
+                    job.name, names[job.name])
+                continue
+            names[job.name] = job.script
+            if not force and up_to_date(job, directory, audio):
+                summary["skipped"] += 1
+                continue
+            if len(pending) >= queue_size:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending[executor.submit(render_job, job, directory, **kwargs)] = job
+        collect(wait(pending)[0])
+
+    summary["time"] = time.perf_counter() - start
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("inputs", nargs="+", help="Directories with scripts or JSON manifests.")
+    parser.add_argument("--out", required=True, help="The directory for outputs.")
+    parser.add_argument("--processes", type=int, help="Number of processes (default: number of processors).")
+    parser.add_argument("--queue", type=int, help="Maximum number of submitted compositions.")
+    parser.add_argument("--bmp", type=float, default=120, help="Tempo of compositions that do not set it.")
+    parser.add_argument("--ticks-per-beat", type=int, default=480, help="Ticks per beat of midi-files.")
+    parser.add_argument("--audio", action="store_true", help="Render WAV files too (requires --sound-font).")
+    parser.add_argument("--sound-font", help="The path to the sound font for audio.")
+    parser.add_argument("--sample-rate", type=int, default=44100, help="Number of samples per second of audio.")
+    parser.add_argument("--force", action="store_true", help="Render up-to-date outputs again.")
+    args = parser.parse_args(argv)
+    if args.audio and not args.sound_font:
+        parser.error("--audio requires --sound-font")
+
+    summary = render_all(read_jobs(args.inputs), args.out, processes=args.processes, queue_size=args.queue,
+                         force=args.force, bmp=args.bmp, ticks_per_beat=args.ticks_per_beat,
+                         sound_font=args.sound_font if args.audio else None, sample_rate=args.sample_rate)
+
+    for script, error in summary["failed"].items():
+        print("failed: {}: {}".format(script, error))
+    seconds = max(summary["time"], 1e-9)
+    print("rendered: {} skipped: {} failed: {} time: {:.2f} s  {:.1f} compositions/s  {:.0f} events/s".format(
+        summary["rendered"], summary["skipped"], len(summary["failed"]), summary["time"],
+        summary["rendered"] / seconds, summary["events"] / seconds))
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""
+Benchmarks of the compile, time conversion, file export and playback scheduling stages.
+
+Run from the root of the repository:
+
+    python -m benchmarks.bench                      # print results
+    python -m benchmarks.bench --save base.json     # store a baseline
+    python -m benchmarks.bench --compare base.json  # compare with a baseline (exit code 1 on regression)
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from composition import Composition, Sequence
+from midiUtilities import transform_events, transform_time, write_to_file
+from note import Note
+
+# Sizes are multiplied by these factors to check scaling curves.
+FACTORS = (1, 2, 4)
+
+
+def generate(notes: int = 8, sequences: int = 1000, depth: int = 100, tracks: int = 4, seed: int = 0) -> Composition:
+    """
+    Generates a synthetic composition.
+
+    :param notes: Number of notes in every sequence.
+    :param sequences: Number of sequences in every track.
+    :param depth: Length of chains of sequences (seq += Sequence(...)).
+    :param tracks: Number of tracks.
+    :param seed: Seed of random generator.
+    :return: The Composition.
+    """
+    rng = random.Random(seed)
+    c = Composition()
+    for track in range(tracks):
+        c.add_track(track, track)
+        s = None
+        for i in range(sequences):
+            sequence = Sequence([Note(rng.randrange(12), rng.randrange(2, 6), velocity=rng.randrange(40, 110),
+                                      duration=rng.choice((1 / 4, 1 / 8, 1 / 16)),
+                                      delay=rng.choice((0, 0, 1 / 16)), start_end=rng.random() < 0.3)
+                                 for _ in range(notes)], track)
+            if i % depth == 0:
+                s = c.add_sequence(sequence)
+                sequence.delay = rng.choice((0, 1, 2))
+            else:
+                s += sequence
+    return c
+
+
+def _stages(composition: Composition, path: str) -> Dict[str, Callable]:
+    events = composition.compile_events()
+    tracks = composition.compile()
+    stages = {
+        "compile": composition.compile_events,
+        "compile_messages": composition.compile,
+        "transform_events": lambda: [transform_events(track.events, bmp=120) for track in events],
+        "transform_time": lambda: [transform_time(track.messages, bmp=120) for track in tracks],
+        "write_to_file": lambda: write_to_file(events, path, bmp=120),
+        "write_single_file": lambda: write_to_file(events, path, bmp=120, single_file=True),
+        "iter_events": lambda: sum(1 for _ in composition.iter_events()),
+    }
+    try:
+        from synth import _merge
+        stages["playback_schedule"] = lambda: _merge(tracks, bmp=120)
+    except ImportError:
+        pass
+    return stages
+
+
+def measure(function: Callable, repeat: int = 3) -> Dict[str, float]:
+    """
+    Measures the best time of several runs and the peak of allocated memory in a separate run.
+
+    :return: Dictionary of the form: {"time": seconds, "peak": bytes}.
+    """
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"time": best, "peak": peak}
+
+
+def slope(sizes: List[int], times: List[float]) -> float:
+    """
+    :return: Exponent of the scaling curve (least squares in log-log scale): 1 is linear, 2 is quadratic.
+    """
+    xs = [math.log(size) for size in sizes]
+    ys = [math.log(max(value, 1e-9)) for value in times]
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / sum((x - mean_x) ** 2 for x in xs)
+
+
+def run(axes: Dict[str, Dict[str, int]], repeat: int = 3) -> Dict[str, Dict]:
+    """
+    Runs all stages for all axes and factors.
+
+    :param axes: Dictionary of the form: {axis name: arguments of generate}. The argument named as the axis is scaled
+                 together with the arguments in SCALED.
+    :return: Dictionary of the form: {"axis/stage": {"sizes": ..., "time": ..., "peak": ..., "slope": ...}}.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as path:
+        for axis, arguments in axes.items():
+            for factor in FACTORS:
+                scaled = dict(arguments, **{name: arguments[name] * factor for name in SCALED.get(axis, (axis,))})
+                for stage, function in _stages(generate(**scaled), path).items():
+                    result = results.setdefault("{}/{}".format(axis, stage), {"sizes": [], "time": [], "peak": []})
+                    measured = measure(function, repeat=repeat)
+                    result["sizes"].append(scaled[axis])
+                    result["time"].append(measured["time"])
+                    result["peak"].append(measured["peak"])
+    for result in results.values():
+        result["slope"] = slope(result["sizes"], result["time"])
+    return results
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float,
+            min_time: float = 0) -> List[str]:
+    """
+    :param min_time: Runs faster than this (in seconds) are too noisy and are not compared.
+    :return: Descriptions of stages that became slower than the baseline by more than tolerance times.
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        for size, value, old in zip(result["sizes"], result["time"], baseline[name]["time"]):
+            if value > old * tolerance and value > min_time:
+                regressions.append("{} (size {}): {:.4f}s -> {:.4f}s".format(name, size, old, value))
+    return regressions
+
+
+AXES = {
+    "notes": {"notes": 16, "sequences": 200, "depth": 50, "tracks": 2},
+    "sequences": {"notes": 4, "sequences": 1000, "depth": 100, "tracks": 2},
+    "depth": {"notes": 4, "sequences": 2000, "depth": 250, "tracks": 1},
+    "tracks": {"notes": 4, "sequences": 250, "depth": 50, "tracks": 2},
+}
+# Arguments scaled together on an axis. Chains only get longer if the number of sequences grows with them,
+# otherwise the amount of work stays the same and a quadratic cost of the depth would have a slope of 1.
+SCALED = {"depth": ("depth", "sequences")}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--save", help="Path of JSON file to store the results as a baseline.")
+    parser.add_argument("--compare", help="Path of JSON baseline to compare the results with.")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="Allowed slowdown relative to the baseline.")
+    parser.add_argument("--max-slope", type=float, default=1.3, help="Allowed exponent of scaling curves.")
+    parser.add_argument("--min-time", type=float, default=0.01,
+                        help="Runs faster than this (in seconds) are not checked for regressions and slopes.")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs of every stage.")
+    parser.add_argument("--scale", type=float, default=1, help="Multiplier of all base sizes.")
+    args = parser.parse_args(argv)
+
+    axes = {axis: dict(arguments, **{axis: max(1, int(arguments[axis] * args.scale))})
+            for axis, arguments in AXES.items()}
+    results = run(axes, repeat=args.repeat)
+
+    failed = False
+    for name, result in results.items():
+        times = " ".join("{:.4f}".format(value) for value in result["time"])
+        peaks = " ".join("{:.1f}".format(value / 2 ** 20) for value in result["peak"])
+        mark = ""
+        if result["slope"] > args.max_slope and max(result["time"]) > args.min_time:
+            mark, failed = "  <- superlinear", True
+        print("{:32} time [s]: {:28} peak [MiB]: {:20} slope: {:.2f}{}".format(name, times, peaks,
+                                                                              result["slope"], mark))
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(results, json.load(file)["results"], args.tolerance, args.min_time)
+        for regression in regressions:
+            print("regression:", regression)
+        failed = failed or bool(regressions)
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump({"python": sys.version, "platform": sys.platform, "cpu_count": os.cpu_count(),
+                       "results": results}, file, indent=2)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
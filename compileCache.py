@@ -0,0 +1,205 @@
+"""
+Module for a content-addressed on-disk cache of compiled compositions.
+
+A compiled composition is stored as one file named by the hash of the composition graph:
+a small JSON header and per-field arrays of all events (times, kinds, notes, velocities).
+Loaded arrays are views of a memory map of the file, nothing is copied.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+from typing import List
+
+import numpy as np
+
+from composition import Composition
+from midiUtilities import EventTrack, MidiEvents
+
+MAGIC = b"PMUC"
+VERSION = 1
+SUFFIX = ".pmuc"
+# Fields of events in the file: (attribute, dtype). The dtype of time is stored in the header.
+FIELDS = (("kind", np.uint8), ("note", np.int16), ("velocity", np.int16))
+ALIGNMENT = 8
+
+
+def composition_hash(composition: Composition, resolution: int = None) -> str:
+    """
+    Computes the hash of everything the compilation depends on: tracks, instruments and the graph of sequences
+    (notes, delays, start_end, repeats and links). A sequence reachable from several parents is hashed once.
+
+    :param composition: The Composition.
+    :param resolution: Number of ticks per whole note of the compilation (see Composition.compile_events).
+    :return: Hex digest.
+    """
+    digest = hashlib.sha256()
+    digest.update(MAGIC + struct.pack("<I", VERSION))
+    if resolution is not None:
+        digest.update(b"resolution" + struct.pack("<Q", resolution))
+    digest.update(repr(list(composition.tracks.items())).encode())
+
+    indexes = {}
+    nodes = []
+    for sequence in composition.initial_sequences:
+        if id(sequence) not in indexes:
+            indexes[id(sequence)] = len(nodes)
+            nodes.append(sequence)
+    for sequence in nodes:
+        for next_sequence in sequence.next_sequences:
+            if id(next_sequence) not in indexes:
+                indexes[id(next_sequence)] = len(nodes)
+                nodes.append(next_sequence)
+
+    digest.update(repr([indexes[id(sequence)] for sequence in composition.initial_sequences]).encode())
+    for sequence in nodes:
+        notes = sequence.toColumnar()
+        digest.update(repr((type(sequence).__qualname__, sequence.id_track, sequence.delay, sequence.start_end,
+                            sequence.repeats, sequence.gap, len(notes),
+                            [indexes[id(s)] for s in sequence.next_sequences])).encode())
+        for values in (notes.pitch, notes.velocity, notes.duration, notes.delay, notes.start_end):
+            digest.update(np.ascontiguousarray(values).tobytes())
+    return digest.hexdigest()
+
+
+def _padding(size: int) -> int:
+    return -size % ALIGNMENT
+
+
+def dump(tracks: List[EventTrack], file):
+    """
+    Writes events of tracks to a binary file.
+
+    :param tracks: List of event tracks.
+    :param file: Binary file.
+    """
+    times = [np.ascontiguousarray(track.events.time) for track in tracks]
+    time_dtype = np.result_type(*times) if times else np.dtype(np.float64)
+    header = json.dumps({"version": VERSION, "counts": [len(track.events) for track in tracks],
+                         "time": time_dtype.str,
+                         "resolution": tracks[0].resolution if tracks else None}).encode()
+    header += b" " * _padding(len(MAGIC) + 4 + len(header))
+    file.write(MAGIC + struct.pack("<I", len(header)) + header)
+
+    columns = [np.concatenate(times).astype(time_dtype) if times else np.empty(0, dtype=time_dtype)]
+    columns += [np.concatenate([getattr(track.events, name) for track in tracks]).astype(dtype) if tracks
+                else np.empty(0, dtype=dtype) for name, dtype in FIELDS]
+    for column in columns:
+        data = column.astype(column.dtype.newbyteorder("<")).tobytes()
+        file.write(data + b"\0" * _padding(len(data)))
+
+
+def load(path: str, composition: Composition) -> List[EventTrack]:
+    """
+    Loads events of tracks from a binary file without copying: arrays are views of a memory map.
+    Labels and instruments are taken from the composition.
+
+    :param path: The path to the file.
+    :param composition: The Composition which was compiled.
+    :return: List of event tracks.
+    """
+    with open(path, "rb") as file:
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    if data[:4] != MAGIC:
+        raise ValueError("{} is not a compiled composition.".format(path))
+    length = struct.unpack("<I", data[4:8])[0]
+    header = json.loads(bytes(data[8:8 + length]))
+    counts = header["counts"]
+    total = sum(counts)
+
+    position = 8 + length
+    columns = []
+    for dtype in [np.dtype(header["time"])] + [np.dtype(dtype).newbyteorder("<") for _, dtype in FIELDS]:
+        columns.append(np.frombuffer(data, dtype=dtype, count=total, offset=position))
+        position += total * dtype.itemsize + _padding(total * dtype.itemsize)
+
+    tracks = []
+    offset = 0
+    for (label, instrument), count in zip(composition.tracks.items(), counts):
+        events = MidiEvents(*(column[offset:offset + count] for column in columns))
+        tracks.append(EventTrack(label, instrument, events, resolution=header.get("resolution")))
+        offset += count
+    return tracks
+
+
+class CompileCache:
+    """
+    On-disk cache of compiled compositions with size-bounded eviction of least recently used entries.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 1 << 30):
+        """
+        :param directory: The directory for cache files.
+        :param max_bytes: Maximum total size of cache files.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def get(self, composition: Composition, resolution: int = None) -> List[EventTrack] | None:
+        """
+        :param composition: The Composition.
+        :param resolution: Number of ticks per whole note of the compilation or None.
+        :return: Cached compiled tracks or None if the composition is not in the cache.
+        """
+        path = self.path(composition_hash(composition, resolution))
+        try:
+            tracks = load(path, composition)
+            # The time of the last use for the eviction.
+            os.utime(path)
+        except (FileNotFoundError, ValueError):
+            return None
+        return tracks
+
+    def put(self, composition: Composition, tracks: List[EventTrack], resolution: int = None):
+        """
+        Stores compiled tracks of the composition and evicts old entries if the cache is too large.
+
+        :param composition: The Composition.
+        :param tracks: Result of composition.compile_events().
+        :param resolution: Number of ticks per whole note of the compilation or None.
+        """
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(descriptor, "wb") as file:
+            dump(tracks, file)
+        os.replace(temporary, self.path(composition_hash(composition, resolution)))
+        self.evict()
+
+    def compile(self, composition: Composition, resolution: int = None) -> List[EventTrack]:
+        """
+        Returns cached compiled tracks or compiles the composition and stores the result.
+
+        :param composition: The Composition.
+        :param resolution: Number of ticks per whole note or None (see Composition.compile_events).
+        :return: List of event tracks (see Composition.compile_events).
+        """
+        tracks = self.get(composition, resolution)
+        if tracks is None:
+            tracks = composition.compile_events(resolution=resolution)
+            self.put(composition, tracks, resolution)
+        return tracks
+
+    def evict(self):
+        """
+        Removes least recently used entries until the total size is not greater than max_bytes.
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(SUFFIX):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                # The file can be mapped by another process (Windows).
+                continue
+            total -= size
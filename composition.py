@@ -1,10 +1,23 @@
 """
 Module for working with note sequences.
 """
-from typing import Dict, List, Tuple, Any
+import copy
+import functools
+import heapq
+from typing import Dict, List, Tuple, Any, Iterator
 
-from midiUtilities import MidiTrack, MidiMessage
-from note import Note
+import numpy as np
+
+import profiling
+from midiUtilities import MidiTrack, MidiMessage, MidiEvents, EventTrack, TempoMap, NOTE_ON, NOTE_OFF, KIND_NAMES
+from note import Note, NoteArray, to_tick
+
+# Lists of at most this many notes are converted in a plain loop: for them building NoteArray costs more.
+SMALL_SEQUENCE = 32
+# Dictionary of the form: {number of notes: kinds of their events} shared by events of short lists.
+_LOOP_KINDS = {}
+# Notes repeat a few durations, so their ticks are converted once.
+_cached_tick = functools.lru_cache(maxsize=4096)(to_tick)
 
 
 class Sequence:
@@ -12,21 +25,174 @@ class Sequence:
     The note sequence.
     """
 
-    def __init__(self, notes: List[Note], id_track, next_sequences=None, delay: float = 0, start_end: bool = False):
+    def __init__(self, notes: List[Note] | NoteArray, id_track, next_sequences=None, delay: float = 0,
+                 start_end: bool = False, repeats: int = 1, gap: float = 0):
         """
-        :param notes: List of notes.
+        :param notes: List of notes or their columnar storage.
         :param id_track: The track's id, which this sequence belongs.
         :param next_sequences: List of Sequences that come after this sequence.
         :param delay: Delay in musical note duration.
         :param start_end: Delay after the start or end of the previous sequence.
+        :param repeats: Number of times the notes are played (see repeat).
+        :param gap: Pause between repetitions in musical note duration.
         """
         if next_sequences is None:
             next_sequences = []
-        self.notes: List[Note] = notes
+        # Compiled graphs of initial sequences that contain this sequence (see Composition.compile_events).
+        self._blocks: List[_Block] = []
+        # Cached result of toEvents and its resolution (used by the incremental compilation).
+        self._events: Tuple[MidiEvents, float, int | None] | None = None
+        # Cached compiled events of the form: (start time, events).
+        self._compiled: Tuple[float, MidiEvents] | None = None
+        self.notes: List[Note] | NoteArray = notes
         self.id_track = id_track
         self.next_sequences = next_sequences
         self.delay = delay
         self.start_end = start_end
+        self.repeats = repeats
+        self.gap = gap
+
+    @property
+    def notes(self) -> List[Note] | NoteArray:
+        return self._notes
+
+    @notes.setter
+    def notes(self, notes: List[Note] | NoteArray):
+        self._notes = notes
+        self.invalidate()
+
+    @property
+    def next_sequences(self) -> List["Sequence"]:
+        return self._next_sequences
+
+    @next_sequences.setter
+    def next_sequences(self, next_sequences: List["Sequence"]):
+        self._next_sequences = next_sequences
+        self._mark_dirty()
+
+    @property
+    def delay(self) -> float:
+        return self._delay
+
+    @delay.setter
+    def delay(self, delay: float):
+        self._delay = delay
+        self._mark_dirty()
+
+    @property
+    def start_end(self) -> bool:
+        return self._start_end
+
+    @start_end.setter
+    def start_end(self, start_end: bool):
+        self._start_end = start_end
+        self._mark_dirty()
+
+    @property
+    def repeats(self) -> int:
+        return self._repeats
+
+    @repeats.setter
+    def repeats(self, repeats: int):
+        self._repeats = repeats
+        self.invalidate()
+
+    @property
+    def gap(self) -> float:
+        return self._gap
+
+    @gap.setter
+    def gap(self, gap: float):
+        self._gap = gap
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        Marks the sequence as changed, so the incremental compilation converts its notes again.
+        Assigning new notes, repeats or gap does it automatically. It must be called after changing notes
+        or next_sequences in place. Assigning delay, start_end or next_sequences marks the sequence dirty
+        without converting its notes again.
+        """
+        self._events = None
+        self._compiled = None
+        self._mark_dirty()
+
+    def _mark_dirty(self):
+        # The compiled graphs that contain the sequence contain all its descendants too,
+        # so marking them dirty is enough for the descendants whose start time changes.
+        for block in self._blocks:
+            block.dirty = True
+
+    @classmethod
+    def fromArrays(cls, pitch, velocity, duration, delay, start_end, id_track, **kwargs):
+        """
+        Creates a columnar sequence directly from note arrays.
+        The remaining arguments are the same as in the constructor.
+        """
+        return cls(NoteArray(pitch, velocity, duration, delay, start_end), id_track, **kwargs)
+
+    def repeat(self, repeats: int, gap: float = 0) -> "Sequence":
+        """
+        Makes the sequence play its notes several times. Notes are converted once and the repetitions
+        are produced as time offsets of the same events, so a long loop costs about the same as one pass.
+        Next sequences follow the end of the last repetition.
+
+        :param repeats: Number of times the notes are played (1 - no repetition).
+        :param gap: Pause between the end of one repetition and the start of the next in musical note duration.
+        :return: The sequence itself.
+        """
+        if repeats < 1:
+            raise ValueError("The number of repeats must be positive.")
+        self.repeats = repeats
+        self.gap = gap
+        return self
+
+    def toColumnar(self) -> NoteArray:
+        """
+        :return: Notes of the sequence in columnar storage.
+        """
+        if isinstance(self.notes, NoteArray):
+            return self.notes
+        return NoteArray.fromNotes(self.notes)
+
+    def toEvents(self, resolution: int = None) -> (MidiEvents, float | int):
+        """
+        Converts notes to a block of midi-events with an absolute time value
+        (relative to the start of the sequence). Time in musical note duration.
+        All times are computed in one vectorized pass, repetitions are tiled from the first one.
+
+        :param resolution: If set, times are integer ticks with this number of ticks per whole note.
+        :return: Tuple of the form: (MidiEvents, sequence's duration).
+        """
+        events, duration = self._pass_events(resolution)
+        if self.repeats == 1:
+            return events, duration
+        gap = self.gap if resolution is None else to_tick(self.gap, resolution)
+        period = duration + gap
+        return events.tile(self.repeats, period), period * (self.repeats - 1) + duration
+
+    def _pass_events(self, resolution: int = None) -> (MidiEvents, float | int):
+        """
+        Converts notes of one repetition (see toEvents).
+        """
+        if not isinstance(self.notes, NoteArray) and 0 < len(self.notes) <= SMALL_SEQUENCE:
+            return _loop_events(self.notes, resolution)
+        notes = self.toColumnar()
+        if len(notes) == 0:
+            if resolution is not None:
+                return MidiEvents(np.empty(0, dtype=np.int64), [], [], []), 0
+            return MidiEvents.empty(), 0
+
+        starts, ends = notes.onsets(resolution)
+        # Messages go in pairs (note_on, note_off) for every note.
+        time = np.empty(2 * len(notes), dtype=starts.dtype)
+        time[0::2] = starts
+        time[1::2] = ends
+        kind = np.empty(2 * len(notes), dtype=np.uint8)
+        kind[0::2] = NOTE_ON
+        kind[1::2] = NOTE_OFF
+        events = MidiEvents(time, kind, np.repeat(notes.pitch, 2), np.repeat(notes.velocity, 2))
+        return events, ends[-1].item()
 
     def toMidi(self) -> (List[MidiMessage], float):
         """
@@ -36,47 +202,43 @@ class Sequence:
 
         :return: Tuple of the form: (List of MidiMessages, sequence's duration).
         """
-        messages = []
-        global_time = 0
-        for i, note in enumerate(self.notes):
-            if i == 0:
-                global_time = note.delay
-            else:
-                global_time += note.delay - int(note.start_end) * self.notes[i - 1].duration
-            messages.append(MidiMessage("note_on", global_time, note=note.toMidi(), velocity=note.velocity))
+        events, duration = self.toEvents()
+        return events.toMessages(), duration
 
-            global_time += note.duration
-            messages.append(MidiMessage("note_off", global_time, note=note.toMidi(), velocity=note.velocity))
+    def start_time(self, last_start_time, last_end_time, resolution: int = None):
+        """
+        :param last_start_time: The start time of the past sequence.
+        :param last_end_time: The end time of the past sequence.
+        :param resolution: If set, times are integer ticks with this number of ticks per whole note.
+        :return: The start time of this sequence.
+        """
+        delay = self.delay if resolution is None else to_tick(self.delay, resolution)
+        if self.start_end:
+            return last_start_time + delay
+        return last_end_time + delay
 
-        return messages, global_time
+    def compile_events(self, last_start_time=0, last_end_time=0) -> List[Tuple[Any, MidiEvents]]:
+        """
+        Turns itself and all sequences into a list of tuples of the form: (track, sequence events).
+        Events of a sequence reached twice with the same start time are shared, not copied.
 
-    def compile(self, last_start_time=0, last_end_time=0) -> List[Tuple[str, List[MidiMessage]]]:
+        :param last_start_time: The start time of the past sequence.
+        :param last_end_time: The end time of the past sequence.
+        :return: List of tuples of the form: (track, MidiEvents).
+        """
+        return compile_graph([(self, last_start_time, last_end_time)])
+
+    def compile(self, last_start_time=0, last_end_time=0) -> List[Tuple[Any, List[MidiMessage]]]:
         """
         Turns itself and all sequences into a list of tuples of the form: (track, sequence message list).
-        This function calls itself recursively, adding data to the final result.
+        The order is the order of depth-first traversal of next_sequences.
 
         :param last_start_time: The start time of the past sequence.
         :param last_end_time: The end time of the past sequence.
         :return: List of tuples of the form: (track, sequence message list).
         """
-        messages, duration = self.toMidi()
-
-        # start_time - the start time of the current sequence.
-        # end_time - the end time of the current sequence.
-        if self.start_end:
-            start_time = last_start_time + self.delay
-        else:
-            start_time = last_end_time + self.delay
-        end_time = start_time + duration
-
-        for i, message in enumerate(messages):
-            messages[i].time += start_time
-
-        results = [(self.id_track, messages)]
-        for sequence in self.next_sequences:
-            results += sequence.compile(start_time, end_time)
-
-        return results
+        return [(id_track, events.toMessages())
+                for id_track, events in self.compile_events(last_start_time, last_end_time)]
 
     def __add__(self, other):
         """
@@ -85,10 +247,234 @@ class Sequence:
         """
         if isinstance(other, Sequence):
             self.next_sequences.append(other)
+            self._mark_dirty()
             return other
         raise TypeError("unsupported operand type(s) for +: 'sequence' and '{}'".format(other.__name__))
 
 
+def _loop_events(notes: List[Note], resolution: int = None) -> (MidiEvents, float | int):
+    """
+    Converts a short list of notes note by note. The sums are the same as in NoteArray.onsets,
+    so the times are identical to the vectorized conversion.
+
+    :param resolution: If set, times are integer ticks with this number of ticks per whole note.
+    """
+    convert = float if resolution is None else lambda value: _cached_tick(value, resolution)
+    time, pitch, velocity = [], [], []
+    start = duration = 0
+    first = True
+    for note in notes:
+        if first:
+            start = convert(note.delay)
+            first = False
+        elif note.start_end:
+            start += convert(note.delay)
+        else:
+            start += convert(note.delay) + duration
+        duration = convert(note.duration)
+        time.append(start)
+        time.append(start + duration)
+        midi = note.toMidi()
+        pitch.append(midi)
+        pitch.append(midi)
+        velocity.append(note.velocity)
+        velocity.append(note.velocity)
+
+    kind = _LOOP_KINDS.get(len(notes))
+    if kind is None:
+        kind = _LOOP_KINDS[len(notes)] = np.tile(np.array([NOTE_ON, NOTE_OFF], dtype=np.uint8), len(notes))
+    # Pitches and velocities are converted in one call.
+    columns = np.array((pitch, velocity), dtype=np.int16)
+    time = np.array(time, dtype=np.float64 if resolution is None else np.int64)
+    return MidiEvents._wrap(time, kind, columns[0], columns[1]), time[-1].item()
+
+
+def compile_graph(roots: List[Tuple[Sequence, float, float]], incremental: bool = False,
+                  resolution: int = None) -> List[Tuple[Any, MidiEvents]]:
+    """
+    Compiles a graph of sequences without recursion.
+    Every sequence is converted to events once, and every pair (sequence, start time)
+    is compiled once: repeated visits reuse the already compiled part of the result.
+
+    :param roots: List of tuples of the form: (sequence, last start time, last end time).
+    :param incremental: Keep compiled events in sequences between calls. Only changed sequences
+                        (see Sequence.invalidate) and sequences whose start time changed are compiled again.
+    :param resolution: If set, the compilation is exact: all times (including times of roots) are integer ticks
+                       with this number of ticks per whole note, and only integers are added.
+    :return: List of tuples of the form: (track, MidiEvents) in depth-first order.
+    """
+    with profiling.stage("compile"):
+        results = _compile_graph(roots, incremental, resolution)
+    if profiling.current() is not None:
+        profiling.count("events_compiled", sum(len(events) for _, events in results))
+    return results
+
+
+def _compile_graph(roots: List[Tuple[Sequence, float, float]], incremental: bool,
+                   resolution: int | None, block: "_Block" = None) -> List[Tuple[Any, MidiEvents]]:
+    """
+    :param block: If set, every visited sequence remembers that it belongs to this compiled graph.
+    """
+    results = []
+    # Dictionary of the form: {id(sequence): (sequence, events relative to its start, duration)}
+    relative = {}
+    # Dictionary of the form: {(id(sequence), start time): (first result, end of results) or None}
+    spans = {}
+    # Ids of sequences on the path from a root to the current sequence.
+    path = set()
+
+    # Stack items: (sequence, last start time, last end time) to enter a sequence
+    # or (None, key, first result) to finish it.
+    stack = [root for root in reversed(roots)]
+    visited = converted = 0
+    while stack:
+        sequence, first, second = stack.pop()
+        if sequence is None:
+            spans[first] = (second, len(results))
+            path.discard(first[0])
+            continue
+
+        if id(sequence) in path:
+            raise ValueError("The sequences form a cycle.")
+        start_time = sequence.start_time(first, second, resolution)
+        key = (id(sequence), start_time)
+        if key in spans:
+            begin, end = spans[key]
+            results.extend(results[begin:end])
+            continue
+        spans[key] = None
+        path.add(id(sequence))
+        if block is not None and all(owner is not block for owner in sequence._blocks):
+            sequence._blocks.append(block)
+            block.sequences.append(sequence)
+
+        visited += 1
+        if incremental:
+            if sequence._events is None or sequence._events[2] != resolution:
+                with profiling.stage("toEvents"):
+                    sequence._events = _to_events(sequence, resolution) + (resolution,)
+                sequence._compiled = None
+                converted += 1
+            events, duration, _ = sequence._events
+        else:
+            if id(sequence) not in relative:
+                with profiling.stage("toEvents"):
+                    relative[id(sequence)] = (sequence,) + _to_events(sequence, resolution)
+                converted += 1
+            _, events, duration = relative[id(sequence)]
+
+        if incremental and sequence._compiled is not None and sequence._compiled[0] == start_time:
+            compiled = sequence._compiled[1]
+        else:
+            compiled = events.shift(start_time)
+            if incremental:
+                sequence._compiled = (start_time, compiled)
+
+        stack.append((None, key, len(results)))
+        results.append((sequence.id_track, compiled))
+        end_time = start_time + duration
+        for next_sequence in reversed(sequence.next_sequences):
+            stack.append((next_sequence, start_time, end_time))
+
+    profiling.count("sequences_visited", visited)
+    profiling.count("sequences_converted", converted)
+    return results
+
+
+def _to_events(sequence: Sequence, resolution: int | None) -> (MidiEvents, float | int):
+    # Subclasses that override toEvents without the resolution are still compiled in musical time.
+    if resolution is None:
+        return sequence.toEvents()
+    return sequence.toEvents(resolution)
+
+
+def _flatten(root: Sequence) -> List[Tuple[Sequence, List[int]]]:
+    """
+    Flattens a graph of sequences to a list, so that it can be pickled without recursion.
+
+    :param root: The initial sequence.
+    :return: List of tuples of the form: (copy of sequence without next_sequences, indexes of next sequences).
+    """
+    indexes = {id(root): 0}
+    nodes = [root]
+    links = []
+    for sequence in nodes:
+        links.append([])
+        for next_sequence in sequence.next_sequences:
+            if id(next_sequence) not in indexes:
+                indexes[id(next_sequence)] = len(nodes)
+                nodes.append(next_sequence)
+            links[-1].append(indexes[id(next_sequence)])
+
+    flat = []
+    for sequence, link in zip(nodes, links):
+        sequence = copy.copy(sequence)
+        sequence._blocks = []
+        sequence.next_sequences = []
+        sequence._compiled = None
+        flat.append((sequence, link))
+    return flat
+
+
+def _compile_flat(flat: List[Tuple[Sequence, List[int]]], resolution: int = None) -> Dict[Any, MidiEvents]:
+    """
+    Restores a flattened graph and compiles it. Runs in a worker process.
+
+    :param flat: Result of _flatten.
+    :param resolution: Number of ticks per whole note or None (see compile_graph).
+    :return: Dictionary of the form: {id_track: events of the track in this graph}.
+    """
+    for sequence, link in flat:
+        sequence.next_sequences = [flat[i][0] for i in link]
+
+    blocks = {}
+    for id_track, events in compile_graph([(flat[0][0], 0, 0)], resolution=resolution):
+        blocks.setdefault(id_track, []).append(events)
+    return {id_track: MidiEvents.concatenate(blocks[id_track]) for id_track in blocks}
+
+
+class _Block:
+    """
+    Events of the graph of one initial sequence compiled by the incremental compilation.
+    Sequences of the graph mark it dirty when they change.
+    """
+
+    def __init__(self, root: Sequence):
+        """
+        :param root: The initial sequence.
+        """
+        self.root = root
+        self.dirty = True
+        self.resolution = None
+        # Dictionary of the form: {id_track: MidiEvents of the track in this graph}
+        self.tracks: Dict[Any, MidiEvents] = {}
+        # Sequences that refer to this block.
+        self.sequences: List[Sequence] = []
+
+    def update(self, resolution: int | None):
+        """
+        Compiles the graph again. Unchanged sequences reuse their compiled events (see compile_graph).
+
+        :param resolution: Number of ticks per whole note or None (see compile_graph).
+        """
+        # Sequences removed from the graph are not linked again.
+        self.detach()
+        blocks = {}
+        for id_track, events in _compile_graph([(self.root, 0, 0)], True, resolution, self):
+            blocks.setdefault(id_track, []).append(events)
+        self.tracks = {id_track: MidiEvents.concatenate(blocks[id_track]) for id_track in blocks}
+        self.resolution = resolution
+        self.dirty = False
+
+    def detach(self):
+        """
+        Removes the block from its sequences, so they do not keep it and its events alive.
+        """
+        for sequence in self.sequences:
+            sequence._blocks = [owner for owner in sequence._blocks if owner is not self]
+        self.sequences = []
+
+
 class Composition:
     """
     The composition.
@@ -99,6 +485,12 @@ class Composition:
         self.tracks: Dict[Any, int] = {}
         # Initial sequences in a composition
         self.initial_sequences: List[Sequence] = []
+        # List of tuples of the form: (position in musical note duration, bmp)
+        self.tempos: List[Tuple[float, float]] = []
+        # Dictionary of the form: {id(initial sequence): _Block} of the incremental compilation.
+        self._blocks: Dict[int, _Block] = {}
+        # Tracks of the last incremental compilation of the form: (key of the compilation, {id_track: MidiEvents}).
+        self._merged: Tuple[Any, Dict[Any, MidiEvents]] | None = None
 
     def add_track(self, id_track: Any, instrument: int):
         """
@@ -123,19 +515,173 @@ class Composition:
         self.initial_sequences.append(sequence)
         return sequence
 
-    def compile(self) -> List[MidiTrack]:
+    def set_tempo(self, bmp: int | float, position: float = 0):
+        """
+        Changes the tempo of the composition from the position.
+
+        :param bmp: Number of metronome beats per minute (= number of quarter notes per minute).
+        :param position: Position in musical note duration.
+        """
+        self.tempos.append((position, bmp))
+
+    def tempo_map(self, bmp: int | float = 120) -> TempoMap:
+        """
+        Precomputes the tempo changes of the composition. The result can be passed everywhere instead of bmp.
+
+        :param bmp: Number of metronome beats per minute before the first change.
+        :return: The TempoMap.
+        """
+        return TempoMap(bmp, self.tempos)
+
+    def compile_events(self, processes: int = None, incremental: bool = False,
+                       resolution: int = None) -> List[EventTrack]:
+        """
+        Compiles the entire composition and returns a list of tracks with columnar events.
+
+        :param processes: If set, independent initial sequences are compiled in a pool of this many processes.
+                          The result is the same as in the serial compilation.
+        :param incremental: Reuse events compiled by the previous incremental call. Only the graphs
+                            of initial sequences that contain a changed sequence are compiled again,
+                            and in them only changed sequences and sequences whose start time changed
+                            (see compile_graph). It is ignored if processes is set.
+        :param resolution: If set, the timeline is exact: times are integer ticks with this number of ticks
+                           per whole note (for example, 4 * ticks_per_beat of the midi-file), so writing to a file
+                           does not convert times of events.
+        :return: List of event tracks with raw (absolute, musical) times. Events of the incremental compilation
+                 are shared with its cache and must not be changed in place.
+        """
+        if incremental and processes is None:
+            events = self._compile_incremental(resolution)
+            return [EventTrack(track, self.tracks[track], events[track], resolution=resolution)
+                    for track in self.tracks]
+
+        # Dictionary of the form: {id_track: list of MidiEvents}
+        blocks = {track: [] for track in self.tracks}
+        if processes is not None and len(self.initial_sequences) > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                for result in executor.map(_compile_flat, [_flatten(sequence) for sequence in self.initial_sequences],
+                                           [resolution] * len(self.initial_sequences)):
+                    for id_track, events in result.items():
+                        blocks[id_track].append(events)
+        else:
+            for id_track, events in compile_graph([(sequence, 0, 0) for sequence in self.initial_sequences],
+                                                  incremental=incremental, resolution=resolution):
+                blocks[id_track].append(events)
+
+        return [EventTrack(track, self.tracks[track], MidiEvents.concatenate(blocks[track]), resolution=resolution)
+                for track in self.tracks]
+
+    def _compile_incremental(self, resolution: int | None) -> Dict[Any, MidiEvents]:
+        """
+        Compiles only dirty graphs of initial sequences and joins the tracks again only if one of them changed.
+
+        :return: Dictionary of the form: {id_track: MidiEvents}.
+        """
+        blocks = {}
+        changed = False
+        with profiling.stage("compile"):
+            for sequence in self.initial_sequences:
+                block = blocks.get(id(sequence)) or self._blocks.get(id(sequence))
+                if block is None or block.root is not sequence:
+                    block = _Block(sequence)
+                if block.dirty or block.resolution != resolution:
+                    block.update(resolution)
+                    changed = True
+                    if profiling.current() is not None:
+                        profiling.count("events_compiled", sum(len(events) for events in block.tracks.values()))
+                blocks[id(sequence)] = block
+                for id_track in block.tracks:
+                    if id_track not in self.tracks:
+                        raise ValueError("The track {} does not exists.".format(id_track))
+        for key, block in self._blocks.items():
+            if blocks.get(key) is not block:
+                block.detach()
+        self._blocks = blocks
+
+        key = (resolution, tuple(id(sequence) for sequence in self.initial_sequences), tuple(self.tracks))
+        if changed or self._merged is None or self._merged[0] != key:
+            roots = [blocks[id(sequence)] for sequence in self.initial_sequences]
+            self._merged = (key, {track: MidiEvents.concatenate([block.tracks[track] for block in roots
+                                                                 if track in block.tracks])
+                                  for track in self.tracks})
+        return self._merged[1]
+
+    def compile(self, processes: int = None, incremental: bool = False) -> List[MidiTrack]:
         """
         Compiles the entire composition and returns a list of MidiTracks.
 
+        :param processes: If set, independent initial sequences are compiled in a pool of this many processes.
+        :param incremental: Reuse events of unchanged sequences compiled by the previous incremental call.
         :return: List of midi-tracks with raw midi-messages..
         """
-        # Dictionary of the form: {id_track: MidiTrack}
-        tracks = {}
-        for track in self.tracks:
-            tracks[track] = MidiTrack(track, self.tracks[track])
+        return [track.toMidiTrack() for track in self.compile_events(processes=processes, incremental=incremental)]
+
+    def iter_events(self) -> Iterator[Tuple[Any, MidiMessage]]:
+        """
+        Lazily yields time-ordered events of all tracks with absolute times (in musical note duration).
+        Sequences are compiled only when the playback time reaches their start,
+        and the already ordered events of the compiled sequences are merged (k-way merge),
+        so memory is bounded by the number of sequences that are sounding or waiting to be compiled,
+        not by the length of the composition. Events of a shared sequence are reused only while it is waiting
+        in the queue again, otherwise they are converted again.
+        Delays must not move events of a sequence before the start of the sequence that precedes it.
 
+        :return: Iterator of tuples of the form: (track, MidiMessage).
+        """
+        # Dictionary of the form: {id(sequence): (sorted relative events, duration)} for sequences in pending.
+        relative = {}
+        # Dictionary of the form: {id(sequence): number of its entries in pending}
+        waiting = {}
+        # Heap of sequences to compile: (start time, number, sequence).
+        pending = [(sequence.start_time(0, 0), i, sequence) for i, sequence in enumerate(self.initial_sequences)]
+        heapq.heapify(pending)
         for sequence in self.initial_sequences:
-            for result in sequence.compile():
-                tracks[result[0]].append(result[1])
+            waiting[id(sequence)] = waiting.get(id(sequence), 0) + 1
+        counter = len(pending)
+        # Heap of cursors over compiled sequences: (time of the next event, number, position, track, events).
+        cursors = []
+        last_time = None
+
+        while pending or cursors:
+            # Compiles every sequence that starts before the next event.
+            while pending and (not cursors or pending[0][0] <= cursors[0][0]):
+                start_time, _, sequence = heapq.heappop(pending)
+                if id(sequence) in relative:
+                    events, duration = relative[id(sequence)]
+                else:
+                    events, duration = sequence.toEvents()
+                    order = np.argsort(events.time, kind="stable")
+                    events = MidiEvents(events.time[order], events.kind[order], events.note[order],
+                                        events.velocity[order])
+                waiting[id(sequence)] -= 1
+                if waiting[id(sequence)]:
+                    relative[id(sequence)] = (events, duration)
+                else:
+                    del waiting[id(sequence)]
+                    relative.pop(id(sequence), None)
+
+                if len(events):
+                    events = events.shift(start_time)
+                    if last_time is not None and events.time[0] < last_time:
+                        raise ValueError("The events of a sequence start before already yielded events.")
+                    heapq.heappush(cursors, (events.time[0], counter, 0, sequence.id_track, events))
+                    counter += 1
+                for next_sequence in sequence.next_sequences:
+                    heapq.heappush(pending, (next_sequence.start_time(start_time, start_time + duration),
+                                             counter, next_sequence))
+                    waiting[id(next_sequence)] = waiting.get(id(next_sequence), 0) + 1
+                    counter += 1
 
-        return list(tracks.values())
+            # Yields events that come before the start of any sequence not yet compiled.
+            while cursors and (not pending or cursors[0][0] <= pending[0][0]):
+                time, number, position, id_track, events = cursors[0]
+                last_time = time
+                yield id_track, MidiMessage(KIND_NAMES[int(events.kind[position])], float(time),
+                                            note=int(events.note[position]),
+                                            velocity=int(events.velocity[position]))
+                position += 1
+                if position < len(events):
+                    heapq.heapreplace(cursors, (events.time[position], number, position, id_track, events))
+                else:
+                    heapq.heappop(cursors)
@@ -11,10 +11,11 @@ s += Sequence(Piano.play_chord(PianoChord("E"), 1 / 8, start_end=False), "p")
 s += Sequence(Piano.play_chord(PianoChord("D"), 1 / 4), "p")
 s += Sequence(Piano.play_chord(PianoChord("D"), 1 / 8, start_end=False), "p")
 s += Sequence(Piano.play_chord(PianoChord("Am"), 1 / 4), "p")
-s += Sequence(Piano.play_chord(PianoChord("Am"), 1 / 8, start_end=False, order=2 * [0, 1, 2, 1]), "p")
+s += Sequence(Piano.play_chord(PianoChord("Am"), 1 / 8, start_end=False, order=[0, 1, 2, 1]), "p").repeat(2)
 s += Sequence(Piano.play_chord(PianoChord("E"), 1 / 4 + 1 / 8), "p")
 s += Sequence(Piano.play_chord(PianoChord("D"), 1 / 4 + 1 / 8), "p")
 s += Sequence(Piano.play_chord(PianoChord("Am"), 1 / 4 + 1 / 8), "p")
 
-write_to_file(c.compile(), r"C:\Users\anluk\Desktop", bmp=120)
-synth(c.compile(), bmp=120, sound_font=r"C:\Users\anluk\Documents\lmms\samples\soundfonts\FluidR3_GM.sf2")
+tracks = c.compile()
+write_to_file(tracks, r"C:\Users\anluk\Desktop", bmp=120)
+synth(tracks, bmp=120, sound_font=r"C:\Users\anluk\Documents\lmms\samples\soundfonts\FluidR3_GM.sf2")
@@ -0,0 +1,209 @@
+"""
+Module for reading Standard MIDI Files into compositions.
+"""
+import mmap
+import struct
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+from composition import Composition, Sequence
+from note import NoteArray
+
+# Number of data bytes of channel messages by the high nibble of the status byte.
+DATA_LENGTHS = {0x80: 2, 0x90: 2, 0xA0: 2, 0xB0: 2, 0xC0: 1, 0xD0: 1, 0xE0: 2}
+
+SET_TEMPO = 0x51
+TRACK_NAME = 0x03
+
+
+class MidiTrackData:
+    """
+    Notes and metadata decoded from one track chunk. Times are in ticks.
+    """
+
+    def __init__(self):
+        self.name: str | None = None
+        # Dictionary of the form: {channel: first program}
+        self.programs: Dict[int, int] = {}
+        # List of tuples of the form: (tick, tempo in microseconds per beat).
+        self.tempos: List[Tuple[int, int]] = []
+        # Columns of notes: start tick, end tick, pitch, velocity, channel.
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+        self.pitches: List[int] = []
+        self.velocities: List[int] = []
+        self.channels: List[int] = []
+
+
+def decode_track(data: bytes) -> MidiTrackData:
+    """
+    Decodes track data, pairing every note_on with the next note_off of the same channel and note.
+
+    :param data: Bytes of track chunk (without the chunk header).
+    :return: Decoded notes and metadata.
+    """
+    track = MidiTrackData()
+    # Dictionary of the form: {(channel, note): list of indexes of notes without end}
+    sounding = {}
+    # The last channel status byte: meta and sysex events do not change it (as in mido).
+    position, tick, running, size = 0, 0, 0, len(data)
+
+    while position < size:
+        # Variable-length delta time.
+        delta = 0
+        while True:
+            byte = data[position]
+            position += 1
+            delta = (delta << 7) | (byte & 0x7f)
+            if byte < 0x80:
+                break
+        tick += delta
+
+        byte = data[position]
+        if byte >= 0x80:
+            status = byte
+            position += 1
+        elif running == 0:
+            raise ValueError("Running status without a previous status byte.")
+        else:
+            status = running
+
+        if status == 0xFF:
+            kind = data[position]
+            length, position = _read_variable_int(data, position + 1)
+            if kind == TRACK_NAME and track.name is None:
+                track.name = data[position:position + length].decode("latin-1")
+            elif kind == SET_TEMPO and length == 3:
+                track.tempos.append((tick, int.from_bytes(data[position:position + 3], "big")))
+            position += length
+            continue
+        if status in (0xF0, 0xF7):
+            length, position = _read_variable_int(data, position)
+            position += length
+            continue
+
+        running = status
+        kind, channel = status & 0xF0, status & 0x0F
+        if kind in (0x80, 0x90):
+            note, velocity = data[position], data[position + 1]
+            if kind == 0x90 and velocity > 0:
+                sounding.setdefault((channel, note), []).append(len(track.starts))
+                track.starts.append(tick)
+                track.ends.append(-1)
+                track.pitches.append(note)
+                track.velocities.append(velocity)
+                track.channels.append(channel)
+            else:
+                indexes = sounding.get((channel, note))
+                if indexes:
+                    track.ends[indexes.pop(0)] = tick
+        elif kind == 0xC0:
+            track.programs.setdefault(channel, data[position])
+        position += DATA_LENGTHS[kind]
+
+    # Notes without note_off end with the track.
+    for indexes in sounding.values():
+        for index in indexes:
+            track.ends[index] = tick
+    return track
+
+
+def _read_variable_int(data: bytes, position: int) -> (int, int):
+    value = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value = (value << 7) | (byte & 0x7f)
+        if byte < 0x80:
+            return value, position
+
+
+def read_tracks(path: str) -> (int, List[MidiTrackData]):
+    """
+    Reads a midi-file through a memory map and decodes all track chunks.
+
+    :param path: The path to the midi-file.
+    :return: Tuple of the form: (ticks per beat, list of decoded tracks).
+    """
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        if data[:4] != b"MThd":
+            raise ValueError("{} is not a midi-file.".format(path))
+        length, _, count, division = struct.unpack(">LHHH", data[4:14])
+        if division & 0x8000:
+            raise ValueError("SMPTE time division is not supported.")
+
+        tracks = []
+        position = 8 + length
+        while len(tracks) < count and position + 8 <= len(data):
+            name, length = data[position:position + 4], struct.unpack(">L", data[position + 4:position + 8])[0]
+            position += 8
+            if name == b"MTrk":
+                tracks.append(decode_track(data[position:position + length]))
+            position += length
+    return division, tracks
+
+
+def read_file(path: str) -> Composition:
+    """
+    Reads a midi-file into a composition: one track and one columnar sequence for every
+    pair (track chunk, channel) with notes. Tracks are named by track names (or numbers)
+    and get the first program of their channel as the instrument. Tempo changes are added to the composition
+    (see Composition.tempo_map).
+
+    :param path: The path to the midi-file.
+    :return: The Composition.
+    """
+    ticks_per_beat, tracks = read_tracks(path)
+    # Musical note duration of one tick (a whole note is 4 beats).
+    scale = 1 / (4 * ticks_per_beat)
+
+    c = Composition()
+    for tick, tempo in sorted(tempo for track in tracks for tempo in track.tempos):
+        c.set_tempo(60 * 10 ** 6 / tempo, tick * scale)
+    for i, track in enumerate(tracks):
+        if not track.starts:
+            continue
+        channels = np.array(track.channels)
+        for channel in np.unique(channels).tolist():
+            mask = channels == channel
+            order = np.argsort(np.array(track.starts)[mask], kind="stable")
+            starts = np.array(track.starts)[mask][order]
+            ends = np.array(track.ends)[mask][order]
+
+            label = track.name or str(i)
+            if len(np.unique(channels)) > 1:
+                label = "{}:{}".format(label, channel)
+            while label in c.tracks:
+                label += "'"
+            c.add_track(label, track.programs.get(channel, 0))
+
+            # Every note is counted from the start of the previous one.
+            delays = np.diff(starts, prepend=0) * scale
+            notes = NoteArray(np.array(track.pitches)[mask][order], np.array(track.velocities)[mask][order],
+                              (ends - starts) * scale, delays, np.ones(len(starts), dtype=np.bool_))
+            c.add_sequence(Sequence(notes, label))
+    return c
+
+
+def _read_file_or_error(path: str) -> Composition | Exception:
+    try:
+        return read_file(path)
+    except Exception as error:
+        return error
+
+
+def read_files(paths: Iterable[str], processes: int = None,
+               chunk_size: int = 16) -> Iterator[Composition | Exception]:
+    """
+    Reads many midi-files in a pool of processes. A file that cannot be read does not stop the others.
+
+    :param paths: Paths to midi-files.
+    :param processes: Number of processes (None - number of processors).
+    :param chunk_size: Number of files sent to a process at once.
+    :return: Iterator of compositions in the order of paths. For a file that cannot be read,
+             the raised exception is yielded instead of its composition.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        yield from executor.map(_read_file_or_error, paths, chunksize=chunk_size)
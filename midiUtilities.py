@@ -1,43 +1,196 @@
 """
 Module for working with midi-messages and files based mido module.
+mido is imported on first use, so building compositions does not load it.
 """
-import os.path
-from typing import List
+from types import MappingProxyType
+from typing import List, Mapping, Tuple, TYPE_CHECKING
 
-import mido
+import numpy as np
+
+import profiling
+
+if TYPE_CHECKING:
+    import mido
+
+# Codes of midi-message kinds stored in MidiEvents (status bytes of channel 0).
+NOTE_OFF = 0x80
+NOTE_ON = 0x90
+KINDS = {"note_off": NOTE_OFF, "note_on": NOTE_ON}
+KIND_NAMES = {code: kind for kind, code in KINDS.items()}
 
 
 class MidiMessage:
     """
     Represents a midi-message.
+    Note and velocity are stored in fixed fields, other mido.Message arguments in a separate dictionary.
     """
 
-    def __init__(self, kind: str, time: float, **kwargs):
+    __slots__ = ("kind", "time", "note", "velocity", "_extra")
+
+    def __init__(self, kind: str, time: float, note: int = None, velocity: int = None, **kwargs):
         self.kind = kind
         # Time can to have different dimension and essence depending on context.
         self.time = time
-        # Magic hack for mido.Message arguments.
-        self.kwargs = kwargs
+        self.note = note
+        self.velocity = velocity
+        # Magic hack for other mido.Message arguments.
+        self._extra = kwargs or None
+
+    @property
+    def kwargs(self) -> Mapping:
+        """
+        :return: Read-only view of all arguments of mido.Message except type and time
+                 (change note, velocity or create a new message instead).
+        """
+        kwargs = {}
+        if self.note is not None:
+            kwargs["note"] = self.note
+        if self.velocity is not None:
+            kwargs["velocity"] = self.velocity
+        if self._extra:
+            kwargs.update(self._extra)
+        return MappingProxyType(kwargs)
+
+    @property
+    def is_note(self) -> bool:
+        """
+        :return: True if the message is note_on or note_off without other arguments, so it fits in MidiEvents.
+        """
+        return self.kind in KINDS and not self._extra
 
-    def toMido(self) -> mido.Message:
+    def toMido(self) -> "mido.Message":
         """
         Transforms himself in midi-message.
 
         :return: mido.Message corresponding to this message
         """
+        import mido
         return mido.Message(type=self.kind, time=self.time, **self.kwargs)
 
     def __eq__(self, other):
         if isinstance(other, MidiMessage):
-            return self.kind == other.kind and self.time == other.time and self.kwargs == other.kwargs
+            return self.kind == other.kind and self.time == other.time and self.note == other.note and \
+                   self.velocity == other.velocity and (self._extra or None) == (other._extra or None)
         return False
 
     def __str__(self):
-        return str({"kind": self.kind, "time": self.time, "kwargs": self.kwargs})
+        return str({"kind": self.kind, "time": self.time, "kwargs": dict(self.kwargs)})
 
     __repr__ = __str__
 
 
+class MidiEvents:
+    """
+    Columnar block of note messages: one array per message attribute.
+    It is the array counterpart of a list of MidiMessages with note_on/note_off kinds.
+    """
+
+    def __init__(self, time, kind, note, velocity):
+        """
+        :param time: Times of messages.
+        :param kind: Kinds of messages (NOTE_ON or NOTE_OFF).
+        :param note: Midi-note numbers.
+        :param velocity: Volumes of notes.
+        """
+        # Times are floats in musical note duration or integer ticks depending on context.
+        self.time = np.asarray(time)
+        if self.time.dtype.kind not in "iuf":
+            self.time = self.time.astype(np.float64)
+        self.kind = np.asarray(kind, dtype=np.uint8)
+        self.note = np.asarray(note, dtype=np.int16)
+        self.velocity = np.asarray(velocity, dtype=np.int16)
+
+    @classmethod
+    def empty(cls):
+        return cls([], [], [], [])
+
+    @classmethod
+    def _wrap(cls, time: np.ndarray, kind: np.ndarray, note: np.ndarray, velocity: np.ndarray) -> "MidiEvents":
+        """
+        Takes arrays that already have the right types as they are (the constructor is too slow for tiny blocks).
+        """
+        events = object.__new__(cls)
+        events.time, events.kind, events.note, events.velocity = time, kind, note, velocity
+        return events
+
+    @classmethod
+    def fromMessages(cls, messages: List[MidiMessage]):
+        """
+        Builds a block of events from note messages.
+
+        :param messages: List of midi-messages with note_on/note_off kinds and without other arguments.
+        :return: MidiEvents with the same messages.
+        """
+        for message in messages:
+            if not message.is_note:
+                raise ValueError("MidiEvents can store only note_on/note_off messages without other arguments, "
+                                 "got {}.".format(message))
+        return cls([message.time for message in messages], [KINDS[message.kind] for message in messages],
+                   [message.note for message in messages], [message.velocity for message in messages])
+
+    @classmethod
+    def concatenate(cls, blocks: List["MidiEvents"]):
+        """
+        Joins blocks of events one after another.
+
+        :param blocks: List of MidiEvents.
+        :return: MidiEvents with all messages of blocks.
+        """
+        if not blocks:
+            return cls.empty()
+        if len(blocks) == 1:
+            return blocks[0]
+        return cls(np.concatenate([block.time for block in blocks]),
+                   np.concatenate([block.kind for block in blocks]),
+                   np.concatenate([block.note for block in blocks]),
+                   np.concatenate([block.velocity for block in blocks]))
+
+    def shift(self, offset):
+        """
+        Returns the same events moved in time by offset. Other arrays are shared, not copied.
+
+        :param offset: Time offset.
+        """
+        return MidiEvents._wrap(self.time + offset, self.kind, self.note, self.velocity)
+
+    def tile(self, count: int, period) -> "MidiEvents":
+        """
+        Repeats the events one after another in one vectorized pass.
+
+        :param count: Number of repetitions.
+        :param period: Time between the starts of repetitions.
+        :return: MidiEvents with count * len(self) events.
+        """
+        offsets = np.arange(count) * period
+        time = (self.time[np.newaxis, :] + offsets[:, np.newaxis]).ravel()
+        return MidiEvents(time, np.tile(self.kind, count), np.tile(self.note, count), np.tile(self.velocity, count))
+
+    def toMessages(self) -> List[MidiMessage]:
+        """
+        Converts the block to a list of midi-messages.
+
+        :return: List of midi-messages.
+        """
+        profiling.count("messages_created", len(self))
+        return [MidiMessage(KIND_NAMES[kind], time, note, velocity)
+                for time, kind, note, velocity in zip(self.time.tolist(), self.kind.tolist(),
+                                                      self.note.tolist(), self.velocity.tolist())]
+
+    def __len__(self):
+        return len(self.time)
+
+    def __eq__(self, other):
+        if isinstance(other, MidiEvents):
+            return len(self) == len(other) and bool(
+                np.array_equal(self.time, other.time) and np.array_equal(self.kind, other.kind)
+                and np.array_equal(self.note, other.note) and np.array_equal(self.velocity, other.velocity))
+        return False
+
+    def __str__(self):
+        return str(self.toMessages())
+
+    __repr__ = __str__
+
 
 class MidiTrack:
     """
@@ -70,59 +223,269 @@ class MidiTrack:
 
         :return: mido.MidiTrack corresponding to this track.
         """
-        track = mido.MidiTrack()
-        # track.append(mido.MetaMessage(mido.MetaMessage('track_name', name=self.label)))
-        track.append(mido.Message(type="program_change", program=self.instrument, time=0))
-        for message in self.messages:
-            track.append(message.toMido())
+        import mido
+        with profiling.stage("toMido"):
+            track = mido.MidiTrack()
+            # track.append(mido.MetaMessage(mido.MetaMessage('track_name', name=self.label)))
+            track.append(mido.Message(type="program_change", program=self.instrument, time=0))
+            for message in self.messages:
+                track.append(message.toMido())
+        profiling.count("mido_messages", len(track))
         return track
 
 
-def transform_time(messages: List[MidiMessage], bmp: int | float,
-                   ticks_per_beat: int = 480, to_tick: bool = True) -> List[MidiMessage]:
+class EventTrack:
+    """
+    Represents a one midi-track with columnar events.
     """
-    Transforms raw midi-messages to midi-message with the necessary time’s attributes.
 
-    :param messages: List of raw midi-messages.
-    :param bmp: Number of metronome beats per minute (= number of quarter notes per minute).
+    def __init__(self, label: str, instrument: int, events: MidiEvents = None, resolution: int = None):
+        """
+        :param label: Name of track.
+        :param instrument: Instrument that is played in this track.
+        :param events: Events of track.
+        :param resolution: Number of ticks per whole note if times of events are integer ticks,
+                           None if they are in musical note duration.
+        """
+        if events is None:
+            events = MidiEvents.empty()
+        self.events = events
+        self.label = label
+        self.instrument = instrument
+        self.resolution = resolution
+
+    def musical_events(self) -> MidiEvents:
+        """
+        :return: Events with times in musical note duration.
+        """
+        if self.resolution is None:
+            return self.events
+        return MidiEvents(self.events.time / self.resolution, self.events.kind, self.events.note,
+                          self.events.velocity)
+
+    def toMidiTrack(self) -> MidiTrack:
+        """
+        :return: MidiTrack with the same messages (times in musical note duration).
+        """
+        return MidiTrack(self.label, self.instrument, self.musical_events().toMessages())
+
+
+def track_events(track: MidiTrack | EventTrack) -> MidiEvents:
+    """
+    :param track: Midi-track or event track.
+    :return: Events of the track (times as they are stored, see track_resolution).
+    """
+    if isinstance(track, EventTrack):
+        return track.events
+    return MidiEvents.fromMessages(track.messages)
+
+
+def note_events(track: MidiTrack | EventTrack) -> MidiEvents:
+    """
+    :param track: Midi-track or event track.
+    :return: Note events of the track with times in musical note duration (other messages are skipped).
+    """
+    if isinstance(track, EventTrack):
+        return track.musical_events()
+    messages = [message for message in track.messages if message.kind in KINDS]
+    return MidiEvents([message.time for message in messages], [KINDS[message.kind] for message in messages],
+                      [message.note for message in messages], [message.velocity for message in messages])
+
+
+def track_resolution(track: MidiTrack | EventTrack) -> int | None:
+    """
+    :param track: Midi-track or event track.
+    :return: Number of ticks per whole note if times of the track are integer ticks, otherwise None.
+    """
+    return getattr(track, "resolution", None)
+
+
+class TempoMap:
+    """
+    Tempo of a composition that changes at musical positions. Segment tables (start position,
+    tempo and start second of every segment) are precomputed once, so converting any number of times
+    is one binary search per time.
+
+    >>> tempo = TempoMap(120, [(1, 60)])
+    >>> tempo.seconds([0.5, 1, 2]).tolist()
+    [1.0, 2.0, 6.0]
+    """
+
+    def __init__(self, bmp: int | float, changes: List[Tuple[float, int | float]] = None):
+        """
+        :param bmp: Number of metronome beats per minute at the beginning.
+        :param changes: List of tuples of the form: (position in musical note duration, new bmp).
+        """
+        changes = sorted(changes or [], key=lambda change: change[0])
+        if any(position < 0 for position, _ in changes) or any(value <= 0 for _, value in changes) or bmp <= 0:
+            raise ValueError("Tempo changes must have non-negative positions and positive tempos.")
+        # A later change at the same position replaces an earlier one.
+        segments = {0: bmp}
+        for position, value in changes:
+            segments[position] = value
+
+        self.positions = np.array(list(segments.keys()), dtype=np.float64)
+        self.bmps = np.array(list(segments.values()), dtype=np.float64)
+        # Seconds per musical note duration (a whole note is 4 beats).
+        self.rates = 240 / self.bmps
+        self.starts = np.concatenate(([0.0], np.cumsum(np.diff(self.positions) * self.rates[:-1])))
+
+    @property
+    def bmp(self) -> float:
+        """
+        :return: The tempo at the beginning.
+        """
+        return float(self.bmps[0])
+
+    def segments(self, times) -> np.ndarray:
+        """
+        :param times: Positions in musical note duration.
+        :return: Index of the segment of every position.
+        """
+        return np.maximum(np.searchsorted(self.positions, times, side="right") - 1, 0)
+
+    def seconds(self, times) -> np.ndarray:
+        """
+        Converts positions to seconds from the beginning.
+
+        :param times: Positions in musical note duration.
+        :return: Array of seconds.
+        """
+        times = np.asarray(times, dtype=np.float64)
+        index = self.segments(times)
+        return self.starts[index] + (times - self.positions[index]) * self.rates[index]
+
+    def shifted(self, start: float) -> "TempoMap":
+        """
+        :param start: Position in musical note duration.
+        :return: The tempo map of the part of the composition that begins at the position.
+        """
+        index = int(self.segments(start))
+        return TempoMap(self.bmps[index], [(position - start, bmp) for position, bmp
+                                           in zip(self.positions.tolist(), self.bmps.tolist()) if position > start])
+
+    def tempo_events(self, ticks_per_beat: int = 480) -> List[Tuple[int, int]]:
+        """
+        :param ticks_per_beat: Number of ticks per beat.
+        :return: List of tuples of the form: (absolute tick, microseconds per beat) for set_tempo meta events.
+        """
+        ticks = np.rint(self.positions * 4 * ticks_per_beat).astype(np.int64)
+        tempos = np.rint(60 * 10 ** 6 / self.bmps).astype(np.int64)
+        return list(zip(ticks.tolist(), tempos.tolist()))
+
+
+def to_seconds(times, bmp: int | float | TempoMap) -> np.ndarray:
+    """
+    :param times: Absolute times in musical note duration.
+    :param bmp: Number of metronome beats per minute or a tempo map.
+    :return: Absolute times in seconds.
+    """
+    if isinstance(bmp, TempoMap):
+        return bmp.seconds(times)
+    return np.asarray(times, dtype=np.float64) / (bmp / (4 * 60))
+
+
+def transform_times(times: np.ndarray, bmp: int | float | TempoMap, ticks_per_beat: int = 480,
+                    to_tick: bool = True, resolution: int = None) -> (np.ndarray, np.ndarray):
+    """
+    Transforms an array of absolute raw times to relative times in one vectorized pass.
+    The input array is not changed.
+
+    :param times: Absolute times in musical note duration or integer ticks (see resolution).
+    :param bmp: Number of metronome beats per minute (= number of quarter notes per minute) or a tempo map.
+                Ticks do not depend on the tempo (it is written by set_tempo events), seconds do.
     :param ticks_per_beat: Number of ticks per beat. Specifies the degree of sampling.
     :param to_tick: Convert to ticks or seconds.
-    :return: List of midi-message with the necessary time’s attributes.
+    :param resolution: Number of ticks per whole note if times are integer ticks. If it is 4 * ticks_per_beat,
+                       then ticks are only subtracted, otherwise absolute ticks are rescaled (rounding does
+                       not accumulate).
+    :return: Tuple of the form: (order of times, relative times in that order).
     """
-    messages.sort(key=lambda x: x.time)
+    with profiling.stage("transform_time"):
+        times = np.asarray(times)
+        order = np.argsort(times, kind="stable")
 
-    # Convert from absolute time to relative time.
-    global_time = 0
-    for i, message in enumerate(messages):
-        time = message.time - global_time
-        global_time = message.time
+        if resolution is not None:
+            times = times[order]
+            if not to_tick:
+                return order, np.diff(to_seconds(times / resolution, bmp), prepend=0)
+            if resolution != 4 * ticks_per_beat:
+                times = (times * (4 * ticks_per_beat) + resolution // 2) // resolution
+            return order, np.diff(times, prepend=0).astype(np.int64)
 
-        messages[i].time = time
+        if isinstance(bmp, TempoMap):
+            times = times[order]
+            if not to_tick:
+                return order, np.diff(bmp.seconds(times), prepend=0)
+            # Absolute ticks are rounded, so rounding does not accumulate.
+            return order, np.diff(np.rint(times * 4 * ticks_per_beat).astype(np.int64), prepend=0)
 
-    for i, message in enumerate(messages):
+        # Convert from absolute time to relative time.
+        deltas = np.diff(times[order], prepend=0)
         # Transform to seconds.
-        messages[i].time /= bmp / (4 * 60)
+        deltas = deltas / (bmp / (4 * 60))
         if to_tick:
-            # Transform to ticks.
-            messages[i].time = int(
-                mido.second2tick(messages[i].time, ticks_per_beat=ticks_per_beat, tempo=1 / (bmp / 60) * 10 ** 6))
+            # Transform to ticks (the same rounding as mido.second2tick).
+            scale = 1 / (bmp / 60) * 10 ** 6 * 1e-6 / ticks_per_beat
+            deltas = np.rint(deltas / scale).astype(np.int64)
+
+    return order, deltas
+
 
-    return messages
+def transform_events(events: MidiEvents, bmp: int | float | TempoMap, ticks_per_beat: int = 480, to_tick: bool = True,
+                     resolution: int = None) -> MidiEvents:
+    """
+    Transforms raw events to time-ordered events with relative times.
+    The input events are not changed.
+
+    :param events: Raw events.
+    :param bmp: Number of metronome beats per minute (= number of quarter notes per minute) or a tempo map.
+    :param ticks_per_beat: Number of ticks per beat. Specifies the degree of sampling.
+    :param to_tick: Convert to ticks or seconds.
+    :param resolution: Number of ticks per whole note if times are integer ticks.
+    :return: New events with relative times.
+    """
+    order, deltas = transform_times(events.time, bmp, ticks_per_beat=ticks_per_beat, to_tick=to_tick,
+                                    resolution=resolution)
+    return MidiEvents(deltas, events.kind[order], events.note[order], events.velocity[order])
+
+
+def transform_time(messages: List[MidiMessage], bmp: int | float | TempoMap,
+                   ticks_per_beat: int = 480, to_tick: bool = True) -> List[MidiMessage]:
+    """
+    Transforms raw midi-messages to midi-message with the necessary time’s attributes.
+    The input messages are not changed, so one compiled result can be transformed several times.
+
+    :param messages: List of raw midi-messages.
+    :param bmp: Number of metronome beats per minute (= number of quarter notes per minute) or a tempo map.
+    :param ticks_per_beat: Number of ticks per beat. Specifies the degree of sampling.
+    :param to_tick: Convert to ticks or seconds.
+    :return: List of new midi-messages with the necessary time’s attributes.
+    """
+    order, deltas = transform_times(np.array([message.time for message in messages], dtype=np.float64), bmp,
+                                    ticks_per_beat=ticks_per_beat, to_tick=to_tick)
+    return [MidiMessage(messages[i].kind, time, messages[i].note, messages[i].velocity,
+                        **(messages[i]._extra or {}))
+            for i, time in zip(order.tolist(), deltas.tolist())]
 
 
-def write_to_file(tracks: List[MidiTrack], path: str, bmp: int, ticks_per_beat: int = 480):
+def write_to_file(tracks: List[MidiTrack], path: str, bmp: int | TempoMap, ticks_per_beat: int = 480,
+                  single_file: bool = False, name: str = "composition", start: float = None, end: float = None):
     """
-    Writes each track to a separate midi-file.
-    Performs necessary transformations before recording.
+    Writes each track to a separate midi-file or all tracks to one Type-1 midi-file.
+    Performs necessary transformations before recording. Tracks are not changed.
 
-    :param tracks: List of midi-tracks.
+    :param tracks: List of midi-tracks (or event tracks).
     :param path: The directory for files.
-    :param bmp: Number of metronome beats per minute (= number of quarter notes per minute).
+    :param bmp: Number of metronome beats per minute (= number of quarter notes per minute) or a tempo map
+                (written to files as set_tempo events).
     :param ticks_per_beat: Number of ticks per beat. Specifies the degree of sampling.
+    :param single_file: Write all tracks to one file.
+    :param name: Name of the file if single_file is set.
+    :param start: If set, only the part of tracks from this position (in musical note duration) is written.
+    :param end: If set, only the part of tracks before this position is written.
     """
-    for i, track in enumerate(tracks):
-        tracks[i].messages = transform_time(track.messages, bmp=bmp, ticks_per_beat=ticks_per_beat)
-    for track in tracks:
-        midi = mido.MidiFile()
-        midi.tracks.append(track.toMido())
-        midi.save(os.path.join(path, track.label + ".midi"))
+    # The writer encodes bytes directly, without mido objects.
+    from midiWriter import write_tracks
+    write_tracks(tracks, path, bmp, ticks_per_beat=ticks_per_beat, single_file=single_file, name=name,
+                 start=start, end=end)
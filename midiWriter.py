@@ -0,0 +1,269 @@
+"""
+Module for writing Standard MIDI Files directly from columnar events, without mido objects.
+Tracks with messages other than plain notes (control changes, pitch bends, explicit channels, ...)
+are encoded message by message.
+"""
+import io
+import os.path
+import struct
+from typing import BinaryIO, List, Tuple
+
+import numpy as np
+
+import profiling
+from midiUtilities import MidiTrack, MidiMessage, MidiEvents, EventTrack, TempoMap, track_events, \
+    track_resolution, transform_events, transform_time
+
+# Channel 9 is reserved for percussion by General MIDI, so tracks skip it.
+CHANNELS = [channel for channel in range(16) if channel != 9]
+
+PROGRAM_CHANGE = 0xC0
+END_OF_TRACK = b"\x00\xff\x2f\x00"
+TRACK_NAME = 0x03
+SET_TEMPO = 0x51
+
+
+def encode_variable_int(value: int) -> bytes:
+    """
+    Encodes a number as a variable-length quantity.
+
+    :param value: Non-negative number (< 2 ** 28).
+    :return: Bytes of the quantity.
+    """
+    result = [value & 0x7f]
+    value >>= 7
+    while value:
+        result.append(value & 0x7f | 0x80)
+        value >>= 7
+    return bytes(reversed(result))
+
+
+def encode_events(events: MidiEvents, channel: int = 0, running_status: int = None) -> bytes:
+    """
+    Encodes time-ordered events with relative times in ticks to track data.
+    All variable-length deltas and running status are computed in one vectorized pass.
+
+    :param events: Events with relative integer times.
+    :param channel: Midi-channel of events.
+    :param running_status: Status byte that is already running before the events.
+    :return: Bytes of track data.
+    """
+    if len(events) == 0:
+        return b""
+
+    deltas = events.time.astype(np.int64)
+    if np.any(deltas != events.time) or deltas.min() < 0 or deltas.max() >= 1 << 28:
+        raise ValueError("Event times must be integer ticks in range 0..2^28-1.")
+    for name, values in (("note", events.note), ("velocity", events.velocity)):
+        if values.min() < 0 or values.max() > 127:
+            raise ValueError("Midi-message {} must be in range 0..127.".format(name))
+
+    lengths = 1 + (deltas >= 1 << 7).astype(np.int64) + (deltas >= 1 << 14) + (deltas >= 1 << 21)
+    status = events.kind.astype(np.int64) | channel
+    previous = np.empty_like(status)
+    previous[0] = -1 if running_status is None else running_status
+    previous[1:] = status[:-1]
+    has_status = status != previous
+
+    sizes = lengths + has_status + 2
+    offsets = np.cumsum(sizes) - sizes
+    data = np.empty(int(sizes.sum()), dtype=np.uint8)
+
+    # Variable-length quantity: the most significant group first, the continuation bit on all but the last.
+    for k in range(4):
+        mask = lengths > k
+        shift = 7 * (lengths[mask] - 1 - k)
+        data[offsets[mask] + k] = (deltas[mask] >> shift) & 0x7f | np.where(shift > 0, 0x80, 0)
+
+    positions = offsets + lengths
+    data[positions[has_status]] = status[has_status]
+    positions += has_status
+    data[positions] = events.note
+    data[positions + 1] = events.velocity
+    return data.tobytes()
+
+
+def encode_messages(messages: List[MidiMessage], channel: int = 0, tempos: List[Tuple[int, int]] = None,
+                    running_status: int = None) -> bytes:
+    """
+    Encodes time-ordered midi-messages of any kind with relative times in ticks to track data,
+    one message at a time.
+
+    :param messages: Messages with relative integer times.
+    :param channel: Midi-channel of messages that do not set their own channel.
+    :param tempos: List of tuples of the form: (absolute tick, microseconds per beat) written as set_tempo
+                   events before the messages of the same tick.
+    :param running_status: Status byte that is already running before the messages.
+    :return: Bytes of track data.
+    """
+    import mido
+    tempos = list(tempos or [])
+    data = bytearray()
+    tick = previous = 0
+    position = 0
+    for message in messages:
+        tick += message.time
+        while position < len(tempos) and tempos[position][0] <= tick:
+            previous = _encode_tempo(data, tempos[position], previous)
+            # Meta events cancel running status.
+            position, running_status = position + 1, None
+        result = mido.Message(message.kind, **message.kwargs)
+        if "channel" not in message.kwargs and hasattr(result, "channel"):
+            result = result.copy(channel=channel)
+        raw = result.bytes()
+        data += encode_variable_int(tick - previous)
+        if raw[0] == running_status:
+            data += bytes(raw[1:])
+        else:
+            data += bytes(raw)
+        # System messages (sysex) cancel running status.
+        running_status = raw[0] if raw[0] < 0xf0 else None
+        previous = tick
+    for tempo in tempos[position:]:
+        previous = _encode_tempo(data, tempo, previous)
+    return bytes(data)
+
+
+def _encode_tempo(data: bytearray, tempo: Tuple[int, int], tick: int) -> int:
+    """
+    Appends a set_tempo event after the tick.
+
+    :return: The tick of the event.
+    """
+    tempo_tick, tempo = tempo
+    data += encode_variable_int(tempo_tick - tick) + b"\xff" + bytes([SET_TEMPO, 3]) + tempo.to_bytes(3, "big")
+    return tempo_tick
+
+
+def encode_track(events: MidiEvents | List[MidiMessage], instrument: int, channel: int = 0, label: str = None,
+                 tempos: List[Tuple[int, int]] = None) -> bytes:
+    """
+    Encodes a whole track chunk: optional name, program change, events and end of track.
+
+    :param events: Time-ordered events with relative times in ticks or midi-messages of any kind
+                   (see encode_messages).
+    :param instrument: Instrument that is played in this track.
+    :param channel: Midi-channel of track.
+    :param label: Name of track. If None, then the name is not written.
+    :param tempos: List of tuples of the form: (absolute tick, microseconds per beat) written as set_tempo
+                   events before the events of the same tick (see TempoMap.tempo_events).
+    :return: Bytes of the chunk.
+    """
+    with profiling.stage("encode"):
+        data = bytearray()
+        if label is not None:
+            name = str(label).encode("latin-1", errors="replace")
+            data += b"\x00\xff" + bytes([TRACK_NAME]) + encode_variable_int(len(name)) + name
+        data += bytes([0, PROGRAM_CHANGE | channel, instrument])
+        if not isinstance(events, MidiEvents):
+            data += encode_messages(events, channel, tempos, running_status=PROGRAM_CHANGE | channel)
+        elif not tempos:
+            data += encode_events(events, channel, running_status=PROGRAM_CHANGE | channel)
+        else:
+            data += _encode_with_tempos(events, channel, tempos)
+        data += END_OF_TRACK
+    return b"MTrk" + struct.pack(">L", len(data)) + bytes(data)
+
+
+def _encode_with_tempos(events: MidiEvents, channel: int, tempos: List[Tuple[int, int]]) -> bytes:
+    """
+    Encodes events interleaved with set_tempo meta events. Events between tempo changes are encoded
+    in vectorized segments.
+    """
+    ticks = np.cumsum(events.time.astype(np.int64))
+    data = bytearray()
+    running_status = PROGRAM_CHANGE | channel
+    begin, tick = 0, 0
+    for tempo_tick, tempo in tempos:
+        end = int(np.searchsorted(ticks, tempo_tick, side="left"))
+        data += _encode_segment(events, ticks, begin, end, tick, channel, running_status)
+        if end > begin:
+            tick = int(ticks[end - 1])
+        # Meta events cancel running status.
+        begin, tick, running_status = end, _encode_tempo(data, (tempo_tick, tempo), tick), None
+    data += _encode_segment(events, ticks, begin, len(events), tick, channel, running_status)
+    return bytes(data)
+
+
+def _encode_segment(events: MidiEvents, ticks: np.ndarray, begin: int, end: int, tick: int, channel: int,
+                    running_status: int | None) -> bytes:
+    """
+    Encodes events[begin:end] where the first delta is counted from the tick.
+    """
+    if end <= begin:
+        return b""
+    deltas = np.diff(ticks[begin:end], prepend=tick)
+    return encode_events(MidiEvents(deltas, events.kind[begin:end], events.note[begin:end],
+                                    events.velocity[begin:end]), channel, running_status=running_status)
+
+
+def write_stream(stream: BinaryIO, chunks: List[bytes], ticks_per_beat: int = 480, midi_type: int = 1):
+    """
+    Writes a Standard MIDI File: header and track chunks.
+
+    :param stream: Binary stream.
+    :param chunks: Encoded track chunks.
+    :param ticks_per_beat: Number of ticks per beat.
+    :param midi_type: Type of midi-file (0 or 1).
+    """
+    with profiling.stage("write_file"):
+        stream.write(b"MThd" + struct.pack(">LHHH", 6, midi_type, len(chunks), ticks_per_beat))
+        for chunk in chunks:
+            stream.write(chunk)
+    profiling.count("bytes_written", 14 + sum(len(chunk) for chunk in chunks))
+
+
+def write_tracks(tracks: List[MidiTrack | EventTrack], path: str, bmp: int | float | TempoMap,
+                 ticks_per_beat: int = 480, single_file: bool = False, name: str = "composition",
+                 start: float = None, end: float = None):
+    """
+    Writes tracks with raw times to midi-files.
+
+    :param tracks: List of midi-tracks or event tracks.
+    :param path: The directory for files.
+    :param bmp: Number of metronome beats per minute (= number of quarter notes per minute) or a tempo map.
+                The tempo map is written as set_tempo events: to every file or to the first track of a single file.
+                A single file gets a set_tempo event for a plain bmp too.
+    :param ticks_per_beat: Number of ticks per beat. Specifies the degree of sampling.
+    :param single_file: Write all tracks to one Type-1 file or each track to a separate file.
+    :param name: Name of the file if single_file is set.
+    :param start: If set, only the part of tracks from this position (in musical note duration) is written.
+                  Notes sounding at the position get note_on at the beginning of the file.
+    :param end: If set, only the part of tracks before this position is written.
+                  Ranges are supported only for tracks of note messages.
+    """
+    if start is not None or end is not None:
+        from timeIndex import NoteIndex
+        tracks = NoteIndex(tracks).musical_slice(start, end)
+        if isinstance(bmp, TempoMap) and start:
+            bmp = bmp.shifted(start)
+    tempos = bmp.tempo_events(ticks_per_beat) if isinstance(bmp, TempoMap) else None
+    if single_file:
+        # Separate files stay the same as files of mido, but the single file always carries its tempo.
+        if tempos is None:
+            tempos = TempoMap(bmp).tempo_events(ticks_per_beat)
+        chunks = [encode_track(_transform(track, bmp, ticks_per_beat), track.instrument,
+                               channel=CHANNELS[i % len(CHANNELS)], label=track.label,
+                               tempos=tempos if i == 0 else None)
+                  for i, track in enumerate(tracks)]
+        with open(os.path.join(path, name + ".midi"), "wb", buffering=io.DEFAULT_BUFFER_SIZE * 16) as file:
+            write_stream(file, chunks, ticks_per_beat=ticks_per_beat)
+        return
+
+    for track in tracks:
+        chunk = encode_track(_transform(track, bmp, ticks_per_beat), track.instrument, tempos=tempos)
+        with open(os.path.join(path, str(track.label) + ".midi"), "wb",
+                  buffering=io.DEFAULT_BUFFER_SIZE * 16) as file:
+            write_stream(file, [chunk], ticks_per_beat=ticks_per_beat)
+
+
+def _transform(track: MidiTrack | EventTrack, bmp: int | float | TempoMap,
+               ticks_per_beat: int) -> MidiEvents | List[MidiMessage]:
+    """
+    Transforms times of the track to relative ticks: columnar events if the track has only note messages,
+    otherwise midi-messages.
+    """
+    if isinstance(track, MidiTrack) and not all(message.is_note for message in track.messages):
+        return transform_time(track.messages, bmp=bmp, ticks_per_beat=ticks_per_beat)
+    return transform_events(track_events(track), bmp=bmp, ticks_per_beat=ticks_per_beat,
+                            resolution=track_resolution(track))
@@ -2,16 +2,58 @@
 Contains a description of what a note is.
 """
 import copy
+from typing import List
+
+import numpy as np
 
 NOTES = {"C": 0, "C#": 1, "Db": 1, "D": 2, "D#": 3, "Eb": 3, "E": 4, "F": 5, "F#": 6,
          "Gb": 6, "G": 7, "G#": 8, "Ab": 8, "A": 9, "A#": 10, "Bb": 10, "B": 11}
 
 
+def to_ticks(values, resolution: int) -> np.ndarray:
+    """
+    Converts musical note durations to integer ticks.
+
+    >>> to_ticks([1/4, 1/3, 1/12], 1920).tolist()
+    [480, 640, 160]
+
+    :param values: Durations in musical note duration (a number or an array).
+    :param resolution: Number of ticks per whole note.
+    :return: Array of int64 ticks.
+    """
+    exact = np.asarray(values, dtype=np.float64) * resolution
+    ticks = np.rint(exact)
+    if np.any(np.abs(ticks - exact) > 1e-6):
+        raise ValueError("Durations cannot be represented exactly with {} ticks per whole note.".format(resolution))
+    return ticks.astype(np.int64)
+
+
+def to_tick(value: float, resolution: int) -> int:
+    """
+    Converts one musical note duration to integer ticks with plain Python arithmetic
+    (the same as to_ticks, but without the overhead of NumPy for a single number).
+
+    >>> to_tick(1/3, 1920)
+    640
+
+    :param value: Duration in musical note duration.
+    :param resolution: Number of ticks per whole note.
+    :return: Number of ticks.
+    """
+    exact = float(value) * resolution
+    ticks = round(exact)
+    if abs(ticks - exact) > 1e-6:
+        raise ValueError("Durations cannot be represented exactly with {} ticks per whole note.".format(resolution))
+    return ticks
+
+
 class BasicNote:
     """
     Information about note out of time.
     """
 
+    __slots__ = ("note", "octave")
+
     def __init__(self, note: int | str, octave: int):
         """
         :param note: Note (0..11).
@@ -43,16 +85,26 @@ class BasicNote:
         self.note -= 12 * n
         self.octave += n
 
+    def copy(self):
+        """
+        :return: Copy of the note.
+        """
+        if type(self) not in (BasicNote, Note):
+            # Subclasses can have their own attributes.
+            return copy.copy(self)
+        note = object.__new__(type(self))
+        note.note = self.note
+        note.octave = self.octave
+        return note
+
     def __add__(self, other: int):
         """
         >>> BasicNote(11, 0) + 1 == BasicNote(0, 1)
         True
-
-        Note: Uses 'copy.copy' for copy obejct if class does not consist 'copy' function.
         """
-        note = self.copy() if hasattr(self, "copy") else copy.copy(self)
-        note.note += other
-        note._normalize()
+        note = self.copy()
+        octaves, note.note = divmod(self.note + other, 12)
+        note.octave = self.octave + octaves
         return note
 
     def __sub__(self, other: int):
@@ -69,6 +121,72 @@ class BasicNote:
     __repr__ = __str__
 
 
+class Pitch(BasicNote):
+    """
+    Immutable note out of time. All 128 midi-pitches are created once and shared, see pitch().
+
+    >>> pitch(60) is pitch(0, 4) and pitch(60) == BasicNote(0, 4)
+    True
+    """
+
+    __slots__ = ()
+
+    def __setattr__(self, key, value):
+        raise AttributeError("Pitch is immutable.")
+
+    def copy(self):
+        """
+        :return: Mutable copy of the note.
+        """
+        return BasicNote(self.note, self.octave)
+
+    def __add__(self, other: int):
+        """
+        >>> pitch(71) + 1 is pitch(72)
+        True
+        """
+        midi = self.toMidi() + other
+        if 0 <= midi < len(PITCHES):
+            return PITCHES[midi]
+        return self.copy() + other
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return pitch, (self.toMidi(),)
+
+    def __hash__(self):
+        return self.toMidi()
+
+
+def _make_pitch(midi: int) -> Pitch:
+    result = object.__new__(Pitch)
+    octave, note = divmod(midi, 12)
+    object.__setattr__(result, "note", note)
+    object.__setattr__(result, "octave", octave - 1)
+    return result
+
+
+PITCHES = tuple(_make_pitch(midi) for midi in range(128))
+
+
+def pitch(note: int | str, octave: int = None) -> Pitch:
+    """
+    Returns the shared immutable pitch.
+
+    :param note: Midi-note number (0..127) if octave is None, otherwise note (0..11 or name).
+    :param octave: Octave.
+    :return: Pitch.
+    """
+    if octave is not None:
+        note = (octave + 1) * 12 + (NOTES[note] if isinstance(note, str) else note)
+    return PITCHES[note]
+
+
 class Note(BasicNote):
     """
     Information about note and her time.
@@ -76,6 +194,8 @@ class Note(BasicNote):
     False
     """
 
+    __slots__ = ("velocity", "duration", "delay", "start_end")
+
     def __init__(self, note: int, octave: int, velocity: int, duration: float, delay: float, start_end: bool):
         """
         :param note: Note (0..11).
@@ -91,6 +211,17 @@ class Note(BasicNote):
         self.delay = delay
         self.start_end = start_end
 
+    def copy(self):
+        """
+        :return: Copy of the note.
+        """
+        note = super().copy()
+        note.velocity = self.velocity
+        note.duration = self.duration
+        note.delay = self.delay
+        note.start_end = self.start_end
+        return note
+
     def __eq__(self, other):
         if isinstance(other, Note):
             return self.note == other.note and self.octave == other.octave and \
@@ -103,3 +234,114 @@ class Note(BasicNote):
                     "duration": self.duration, "delay": self.delay, "start_end": self.start_end})
 
     __repr__ = __str__
+
+
+class NoteArray:
+    """
+    Columnar storage of notes: one array per note attribute.
+    Note number and octave are stored together as a midi-note number (pitch).
+    """
+
+    def __init__(self, pitch, velocity, duration, delay, start_end):
+        """
+        :param pitch: Midi-note numbers.
+        :param velocity: Volumes of notes.
+        :param duration: Durations in musical note duration.
+        :param delay: Delays in musical note duration.
+        :param start_end: Delay after the start or end of the previous note.
+        """
+        self.pitch = np.asarray(pitch, dtype=np.int16)
+        self.velocity = np.asarray(velocity, dtype=np.int16)
+        self.duration = np.asarray(duration, dtype=np.float64)
+        self.delay = np.asarray(delay, dtype=np.float64)
+        self.start_end = np.asarray(start_end, dtype=np.bool_)
+        if not (len(self.pitch) == len(self.velocity) == len(self.duration) == len(self.delay)
+                == len(self.start_end)):
+            raise ValueError("All note arrays must have the same length.")
+
+    @classmethod
+    def fromNotes(cls, notes: List[Note]):
+        """
+        Builds columnar storage from a list of notes.
+
+        :param notes: List of notes.
+        :return: NoteArray with the same notes.
+        """
+        return cls([note.toMidi() for note in notes], [note.velocity for note in notes],
+                   [note.duration for note in notes], [note.delay for note in notes],
+                   [note.start_end for note in notes])
+
+    @classmethod
+    def concatenate(cls, arrays: List["NoteArray"]):
+        """
+        Joins note arrays one after another.
+
+        :param arrays: List of NoteArrays.
+        :return: NoteArray with all notes of arrays.
+        """
+        if not arrays:
+            return cls([], [], [], [], [])
+        return cls(np.concatenate([array.pitch for array in arrays]),
+                   np.concatenate([array.velocity for array in arrays]),
+                   np.concatenate([array.duration for array in arrays]),
+                   np.concatenate([array.delay for array in arrays]),
+                   np.concatenate([array.start_end for array in arrays]))
+
+    def toNotes(self) -> List[Note]:
+        """
+        Converts columnar storage back to a list of notes.
+
+        :return: List of notes.
+        """
+        return [self[i] for i in range(len(self))]
+
+    def onsets(self, resolution: int = None) -> (np.ndarray, np.ndarray):
+        """
+        Computes the start and end time of every note relative to the start of the sequence
+        in a single cumulative-sum pass.
+        Float times are not bit-identical to a note-by-note loop that groups the sums differently
+        (like the original Sequence.toMidi) when durations are not binary fractions (1/3, 1/5, ...):
+        both accumulate rounding errors, and they differ by at most len(self) * 2.2e-16 relative to the times.
+        Use resolution for exact times.
+
+        :param resolution: If set, times are exact integer ticks with this number of ticks per whole note
+                           (durations are converted once, then only integers are summed).
+        :return: Tuple of the form: (start times, end times).
+        """
+        duration, delay = self.duration, self.delay
+        if resolution is not None:
+            duration, delay = to_ticks(duration, resolution), to_ticks(delay, resolution)
+        # Delay of a note is counted from the end of the previous note unless start_end is set,
+        # so the step to the next onset is the delay plus (maybe) the previous duration.
+        steps = delay.copy()
+        steps[1:] += duration[:-1] * ~self.start_end[1:]
+        starts = np.cumsum(steps)
+        return starts, starts + duration
+
+    def __len__(self):
+        return len(self.pitch)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return NoteArray(self.pitch[item], self.velocity[item], self.duration[item],
+                             self.delay[item], self.start_end[item])
+        octave, note = divmod(int(self.pitch[item]), 12)
+        return Note(note, octave - 1, velocity=int(self.velocity[item]), duration=float(self.duration[item]),
+                    delay=float(self.delay[item]), start_end=bool(self.start_end[item]))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __eq__(self, other):
+        if isinstance(other, NoteArray):
+            return len(self) == len(other) and bool(
+                np.array_equal(self.pitch, other.pitch) and np.array_equal(self.velocity, other.velocity)
+                and np.array_equal(self.duration, other.duration) and np.array_equal(self.delay, other.delay)
+                and np.array_equal(self.start_end, other.start_end))
+        return False
+
+    def __str__(self):
+        return str(self.toNotes())
+
+    __repr__ = __str__
@@ -1,7 +1,84 @@
-import re
-from typing import List
+from functools import lru_cache
+from typing import List, Tuple
 
-from note import Note, BasicNote
+import numpy as np
+
+from note import NOTES, Note, NoteArray, BasicNote, pitch
+
+# Intervals (in semitones from the tonic) of chord qualities in root position.
+CHORDS = {
+    "": (0, 4, 7), "m": (0, 3, 7), "dim": (0, 3, 6), "aug": (0, 4, 8), "+": (0, 4, 8),
+    "sus2": (0, 2, 7), "sus4": (0, 5, 7), "sus": (0, 5, 7),
+    "6": (0, 4, 7, 9), "m6": (0, 3, 7, 9),
+    "7": (0, 4, 7, 10), "maj7": (0, 4, 7, 11), "m7": (0, 3, 7, 10), "mmaj7": (0, 3, 7, 11),
+    "dim7": (0, 3, 6, 9), "m7b5": (0, 3, 6, 10), "aug7": (0, 4, 8, 10), "7sus4": (0, 5, 7, 10),
+    "add9": (0, 4, 7, 14), "9": (0, 4, 7, 10, 14), "maj9": (0, 4, 7, 11, 14), "m9": (0, 3, 7, 10, 14),
+}
+
+
+def _note(note: int, octave: int) -> BasicNote:
+    """
+    :return: The shared immutable pitch or a new BasicNote if the note is out of midi range.
+    """
+    midi = (octave + 1) * 12 + note
+    if 0 <= midi < 128:
+        return pitch(midi)
+    return BasicNote(note, octave)
+
+
+def parse_chord(chord: str) -> (str, Tuple[int, ...], str | None):
+    """
+    Splits the chord name into tonic, intervals and bass note.
+
+    >>> parse_chord("Ebm7/Gb")
+    ('Eb', (0, 3, 7, 10), 'Gb')
+
+    :param chord: For example, Cm, D#7, Fsus4, C/E, etc.
+    :return: Tuple of the form: (tonic, intervals, bass note or None).
+    """
+    tonic = chord[:2] if chord[:2] in NOTES else chord[:1]
+    quality, _, bass = chord[len(tonic):].partition("/")
+    if tonic not in NOTES or quality not in CHORDS or (bass and bass not in NOTES):
+        raise ValueError("Unknown chord {}.".format(chord))
+    return tonic, CHORDS[quality], bass or None
+
+
+def chord_voicing(chord: str, octave: int = 3, is_sorted: bool = True, is_normalized: bool = True,
+                  inversion: int = 0) -> Tuple[BasicNote, ...]:
+    """
+    Returns the shared voicing of the chord. Results are cached, so a repeated lookup is a dictionary hit.
+    The arguments are the same as in PianoChord.
+
+    :return: Tuple of notes, the tonic first if not sorted.
+    """
+    return _voiced_chord(chord, octave, is_sorted, is_normalized, inversion)[1]
+
+
+@lru_cache(maxsize=None)
+def _voiced_chord(chord: str, octave: int, is_sorted: bool, is_normalized: bool,
+                  inversion: int) -> (BasicNote, Tuple[BasicNote, ...]):
+    """
+    :return: Tuple of the form: (tonic, voicing), see chord_voicing.
+    """
+    tonic_name, intervals, bass = parse_chord(chord)
+    tonic = _note(NOTES[tonic_name], octave)
+
+    notes = [tonic + interval for interval in intervals]
+    if is_normalized:
+        notes = [_note(note.note, tonic.octave) for note in notes]
+
+    if bass is not None:
+        classes = [note.note for note in notes]
+        if NOTES[bass] in classes:
+            inversion = classes.index(NOTES[bass])
+        else:
+            notes.insert(0, _note(NOTES[bass], tonic.octave - 1))
+    # Inversion: the first chord tones go up an octave.
+    notes = [note + 12 if i < inversion else note for i, note in enumerate(notes)]
+
+    if is_sorted:
+        notes.sort(key=lambda x: x.toMidi())
+    return tonic, tuple(notes)
 
 
 class PianoChord:
@@ -9,28 +86,22 @@ class PianoChord:
     The piano chord.
     """
 
-    def __init__(self, chord: str, octave: int = 3, is_sorted: bool = True, is_normalized: bool = True):
+    def __init__(self, chord: str, octave: int = 3, is_sorted: bool = True, is_normalized: bool = True,
+                 inversion: int = 0):
         """
-        Currently only minor and major chords are available.
+        Available qualities are keys of CHORDS (major, minor, 7ths, diminished, augmented, sus, etc.).
+        A bass note after a slash (C/E) selects the inversion; a bass note out of the chord is added below.
+        Notes are shared immutable pitches (see note.Pitch).
 
-        :param chord: For example, Cm, D#, etc.
+        :param chord: For example, Cm, D#, G7, Bdim, C/E, etc.
         :param octave: The octave number on which the tonic is located.
         :param is_sorted: Sort or not.
         :param is_normalized: Normalize or not.
+        :param inversion: Number of the first chord tones raised by an octave (after normalization).
         """
-        keys = re.split("(m)", chord)
-
-        self.tonic: BasicNote = BasicNote(keys[0], octave)
-
-        self.notes: List[BasicNote] = [self.tonic, self.tonic + 4, self.tonic + 7]
-        if len(keys) > 1:
-            if keys[1] == "m":
-                self.notes[1] -= 1
-
-        if is_normalized:
-            self.normalize()
-        if is_sorted:
-            self.sort()
+        tonic, notes = _voiced_chord(chord, octave, is_sorted, is_normalized, inversion)
+        self.tonic: BasicNote = tonic
+        self.notes: List[BasicNote] = list(notes)
 
     def sort(self):
         """
@@ -42,8 +113,7 @@ class PianoChord:
         """
         Combines all notes into one octave (the octave of the tonic is taken as the main one).
         """
-        for i, note in enumerate(self.notes):
-            self.notes[i].octave = self.tonic.octave
+        self.notes = [_note(note.note, self.tonic.octave) for note in self.notes]
 
     def __getitem__(self, item):
         return self.notes[item]
@@ -98,3 +168,53 @@ class Piano:
             notes.append(Note(note=chord[note].note, octave=chord[note].octave, duration=duration[i],
                               velocity=velocity[i], delay=delay[i], start_end=start_end[i]))
         return notes
+
+    @staticmethod
+    def play_progression(chords, duration=1, delay=0, start_end=True, velocity=64, order=None) -> NoteArray:
+        """
+        Plays a whole progression at once and returns the notes of one sequence in columnar storage.
+        The result is played as the chain of sequences of play_chord calls (seq += Sequence(...)):
+        the first note of every chord is counted from the end of the previous chord.
+
+        Every note parameter is either one value for all notes, a list with a value for every chord
+        (the value is one value or a list for every note of the chord, as in play_chord)
+        or a numpy.ndarray with a value for every note of the progression (for example, a velocity curve).
+
+        :param chords: List of chords, specified as chord names, PianoChords, or lists of BasicNote.
+        :param duration: Duration in musical note duration.
+        :param delay: Delay in musical note duration.
+        :param velocity: Volume of note.
+        :param order: In what order to play the notes: one list for all chords or a list for every chord.
+                      If None, then play all the notes in the chord in order.
+        :param start_end: Delay after the start or end of the previous note.
+        :return: NoteArray with the notes of the progression.
+        """
+        pitches = [np.array([note.toMidi() for note in (chord_voicing(chord) if isinstance(chord, str) else chord)])
+                   for chord in chords]
+
+        if order is None:
+            orders = [np.arange(len(chord)) for chord in pitches]
+        elif len(order) and hasattr(order[0], "__getitem__"):
+            orders = [np.asarray(chord_order) for chord_order in order]
+        else:
+            orders = [np.asarray(order)] * len(pitches)
+        lengths = [len(chord_order) for chord_order in orders]
+        total = sum(lengths)
+
+        def expand(value, dtype):
+            if isinstance(value, np.ndarray):
+                return value.astype(dtype)
+            if not hasattr(value, "__getitem__"):
+                return np.full(total, value, dtype=dtype)
+            return np.concatenate([np.broadcast_to(np.asarray(value[i], dtype=dtype), (length,))
+                                   for i, length in enumerate(lengths)] + [np.empty(0, dtype=dtype)])
+
+        start_end = expand(start_end, np.bool_)
+        # The first note of every chord follows the end of the previous chord.
+        firsts = np.cumsum(lengths) - lengths
+        start_end[firsts[np.array(lengths) > 0]] = False
+
+        return NoteArray(np.concatenate([chord[chord_order] for chord, chord_order in zip(pitches, orders)] +
+                                        [np.empty(0, dtype=np.int16)]),
+                         expand(velocity, np.int16), expand(duration, np.float64), expand(delay, np.float64),
+                         start_end)
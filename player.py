@@ -0,0 +1,232 @@
+"""
+Module for non-blocking playback on an asyncio event loop based fluidsynth.
+"""
+import asyncio
+from typing import List
+
+import numpy as np
+
+from midiUtilities import MidiTrack, EventTrack, MidiEvents, TempoMap, NOTE_ON, to_seconds, note_events
+from midiWriter import CHANNELS
+from timeIndex import NoteIndex
+
+
+class SharedSynth:
+    """
+    One synthesizer shared by several players: every player gets its own channels.
+    """
+
+    def __init__(self, sound_font: str = None, synth=None):
+        """
+        :param sound_font: The path to the sound font.
+        :param synth: Started fluidsynth.Synth (or an object with the same methods).
+                      If None, then a new fluidsynth.Synth with an audio driver is started.
+        """
+        if synth is None:
+            import fluidsynth
+            synth = fluidsynth.Synth()
+            synth.start()
+        self.synth = synth
+        self.font = synth.sfload(sound_font) if sound_font is not None else None
+        self.free: List[int] = list(CHANNELS)
+
+    def allocate(self, instruments: List[int]) -> List[int]:
+        """
+        Takes free channels and selects instruments on them.
+
+        :param instruments: Instrument of every channel.
+        :return: List of channels.
+        """
+        if len(instruments) > len(self.free):
+            raise ValueError("Not enough free channels: {} needed, {} free.".format(len(instruments), len(self.free)))
+        channels, self.free = self.free[:len(instruments)], self.free[len(instruments):]
+        for channel, instrument in zip(channels, instruments):
+            self.synth.program_select(channel, self.font, 0, instrument)
+        return channels
+
+    def release(self, channels: List[int]):
+        """
+        Returns channels to free ones.
+        """
+        self.free = sorted(self.free + channels)
+
+
+class Player:
+    """
+    Plays tracks on the asyncio event loop. Events are sorted and indexed once, so looped playback
+    and seeking do not sort again. Deadlines are absolute (loop.time()), so errors of waiting do not accumulate.
+    Notes that are sounding at the position where playback starts (or resumes) are started there.
+    """
+
+    def __init__(self, tracks: List[MidiTrack | EventTrack], bmp: int | float | TempoMap, synth: SharedSynth,
+                 loop: bool = False):
+        """
+        :param tracks: List of tracks with raw times.
+        :param bmp: Number of metronome beats per minute (= number of quarter notes per minute) or a tempo map.
+        :param synth: The shared synthesizer.
+        :param loop: Play endlessly or not.
+        """
+        # Only notes are played, other messages (program changes, controllers) are skipped.
+        events = [note_events(track) for track in tracks]
+        all_events = MidiEvents.concatenate(events)
+        tracks_of_events = np.repeat(np.arange(len(events)), [len(block) for block in events])
+
+        order = np.argsort(all_events.time, kind="stable")
+        # Absolute times in seconds.
+        self.times = to_seconds(all_events.time[order], bmp)
+        self.kinds = all_events.kind[order].tolist()
+        self.notes = all_events.note[order].tolist()
+        self.velocities = all_events.velocity[order].tolist()
+        self.synth = synth
+        self.channels = synth.allocate([track.instrument for track in tracks])
+        self.event_channels = [self.channels[i] for i in tracks_of_events[order].tolist()]
+        self.index = NoteIndex.fromEvents(MidiEvents(self.times, all_events.kind[order], all_events.note[order],
+                                                     all_events.velocity[order]), tracks_of_events[order])
+        self.duration = float(self.times[-1]) if len(self.times) else 0.0
+        self.loop = loop
+
+        # Playback position in seconds from the beginning.
+        self.position = 0.0
+        self.playing = False
+        self._index = 0
+        self._origin = 0.0
+        # Set of (channel, note) that are sounding now.
+        self._sounding = set()
+        self._changed: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> asyncio.Task:
+        """
+        Starts (or resumes) playback from the current position. Must be called in a running event loop.
+
+        :return: The task of playback.
+        """
+        if self._task is None or self._task.done():
+            self._changed = asyncio.Event()
+            self.playing = True
+            self._task = asyncio.get_running_loop().create_task(self._play())
+        elif not self.playing:
+            self.playing = True
+            self._changed.set()
+        return self._task
+
+    def pause(self):
+        """
+        Pauses playback. The position is kept.
+        """
+        if self.playing:
+            self.position = self._now()
+            self.playing = False
+            self._all_notes_off()
+            if self._changed is not None:
+                self._changed.set()
+
+    def stop(self):
+        """
+        Stops playback and rewinds to the beginning.
+        """
+        if self._task is not None:
+            self._task.cancel()
+        self.playing = False
+        self._all_notes_off()
+        self.position = 0.0
+
+    def seek(self, seconds: float):
+        """
+        Moves playback to the time. Unlike start positions of other functions, it is in seconds,
+        like the position of the player (to_seconds converts a musical position with the tempo).
+
+        :param seconds: Time in seconds from the beginning.
+        """
+        self._all_notes_off()
+        self.position = seconds
+        self._index = int(np.searchsorted(self.times, seconds, side="left"))
+        self._origin = self._time() - seconds
+        if self.playing:
+            self._resume_notes()
+        if self._changed is not None:
+            self._changed.set()
+
+    def close(self):
+        """
+        Stops playback and releases the channels of the synthesizer.
+        """
+        self.stop()
+        self.synth.release(self.channels)
+        self.channels = []
+
+    def _time(self) -> float:
+        try:
+            return asyncio.get_running_loop().time()
+        except RuntimeError:
+            return 0.0
+
+    def _now(self) -> float:
+        return self._time() - self._origin if self.playing else self.position
+
+    def _resume_notes(self):
+        """
+        Starts notes that began before the position and are still sounding at it.
+        """
+        for i in self.index.sounding(self.position, include_onsets=False).tolist():
+            channel, note = self.channels[int(self.index.tracks[i])], int(self.index.pitch[i])
+            self.synth.synth.noteon(channel, note, int(self.index.velocity[i]))
+            self._sounding.add((channel, note))
+
+    def _all_notes_off(self):
+        for channel, note in self._sounding:
+            self.synth.synth.noteoff(channel, note)
+        self._sounding.clear()
+
+    async def _wait(self, timeout: float | None) -> bool:
+        """
+        Waits for the timeout or a change of state.
+
+        :return: True if the state changed.
+        """
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self._changed.clear()
+        return True
+
+    async def _play(self):
+        loop = asyncio.get_running_loop()
+        self.seek(self.position)
+        try:
+            while True:
+                if not self.playing:
+                    await self._wait(None)
+                    self._origin = loop.time() - self.position
+                    if self.playing:
+                        self._resume_notes()
+                    continue
+
+                if self._index >= len(self.times):
+                    if not self.loop or not len(self.times):
+                        break
+                    # The next pass begins right after the last event.
+                    self._index = 0
+                    self._origin += self.duration
+                    continue
+
+                delay = self._origin + self.times[self._index] - loop.time()
+                if delay > 0 and await self._wait(delay):
+                    continue
+
+                i = self._index
+                self._index += 1
+                channel = self.event_channels[i]
+                if self.kinds[i] == NOTE_ON:
+                    self.synth.synth.noteon(channel, self.notes[i], self.velocities[i])
+                    self._sounding.add((channel, self.notes[i]))
+                else:
+                    self.synth.synth.noteoff(channel, self.notes[i])
+                    self._sounding.discard((channel, self.notes[i]))
+        finally:
+            self._all_notes_off()
+            # After stop() the position is already rewound.
+            if self.playing:
+                self.position = 0.0 if self._index >= len(self.times) else self._now()
+            self.playing = False
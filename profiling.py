@@ -0,0 +1,173 @@
+"""
+Module for opt-in instrumentation of the compile-export-play pipeline:
+per-stage timers, counters and allocation statistics.
+
+>>> with profile() as profiler:
+...     with stage("work"):
+...         count("items", 3)
+>>> profiler.counters["items"], profiler.stages["work"]["calls"]
+(3, 1)
+
+When profiling is disabled, stage returns a shared empty context manager and count returns immediately.
+"""
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from typing import Dict
+
+_NULL = nullcontext()
+
+
+class Profiler:
+    """
+    Collects timers, counters and allocation statistics of stages.
+    """
+
+    def __init__(self, allocations: bool = False):
+        """
+        :param allocations: Trace memory allocations (slow) or not.
+        """
+        self.allocations = allocations
+        # Dictionary of the form: {stage: {"calls": ..., "time": seconds, "allocated": bytes}}
+        self.stages: Dict[str, Dict[str, float]] = {}
+        # Dictionary of the form: {counter: value}
+        self.counters: Dict[str, int] = {}
+        # Spans of stages for the trace: (stage, start, duration, thread id).
+        self.spans = []
+        self.origin = time.perf_counter()
+        self.peak = 0
+        self.owns_tracing = False
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Measures the time (and allocations) of the code inside the context.
+
+        :param name: Name of the stage.
+        """
+        before = tracemalloc.get_traced_memory()[0] if self.allocations else 0
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            with self._lock:
+                stats = self.stages.setdefault(name, {"calls": 0, "time": 0.0, "allocated": 0})
+                stats["calls"] += 1
+                stats["time"] += duration
+                if self.allocations:
+                    current, peak = tracemalloc.get_traced_memory()
+                    stats["allocated"] += current - before
+                    self.peak = max(self.peak, peak)
+                self.spans.append((name, start - self.origin, duration, threading.get_ident()))
+
+    def count(self, name: str, value: int = 1):
+        """
+        Increases the counter.
+
+        :param name: Name of the counter.
+        :param value: Increment.
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def report(self) -> dict:
+        """
+        :return: Dictionary with stages, counters and the peak of traced memory.
+        """
+        return {"stages": {name: dict(stats) for name, stats in self.stages.items()},
+                "counters": dict(self.counters), "peak": self.peak}
+
+    def export_trace(self, path: str):
+        """
+        Writes stages and counters in the Chrome trace event format (chrome://tracing, Perfetto).
+
+        :param path: The path to the JSON file.
+        """
+        pid = os.getpid()
+        events = [{"name": name, "ph": "X", "ts": start * 1e6, "dur": duration * 1e6, "pid": pid, "tid": tid}
+                  for name, start, duration, tid in self.spans]
+        end = max((start + duration for _, start, duration, _ in self.spans), default=0)
+        events += [{"name": name, "ph": "C", "ts": end * 1e6, "pid": pid, "args": {name: value}}
+                   for name, value in self.counters.items()]
+        with open(path, "w") as file:
+            json.dump({"traceEvents": events, "otherData": self.report()}, file)
+
+
+# The active profiler or None if profiling is disabled.
+_profiler: Profiler | None = None
+
+
+def enable(allocations: bool = False) -> Profiler:
+    """
+    Enables profiling with a new profiler.
+
+    :param allocations: Trace memory allocations or not.
+    :return: The new profiler.
+    """
+    global _profiler
+    _profiler = Profiler(allocations=allocations)
+    # Tracing is stopped on disable only if it was started here.
+    _profiler.owns_tracing = allocations and not tracemalloc.is_tracing()
+    if _profiler.owns_tracing:
+        tracemalloc.start()
+    return _profiler
+
+
+def disable() -> Profiler | None:
+    """
+    Disables profiling.
+
+    :return: The profiler that was active.
+    """
+    global _profiler
+    profiler, _profiler = _profiler, None
+    if profiler is not None and profiler.owns_tracing:
+        tracemalloc.stop()
+    return profiler
+
+
+def current() -> Profiler | None:
+    """
+    :return: The active profiler or None.
+    """
+    return _profiler
+
+
+@contextmanager
+def profile(allocations: bool = False):
+    """
+    Enables profiling inside the context.
+
+    :param allocations: Trace memory allocations or not.
+    """
+    profiler = enable(allocations=allocations)
+    try:
+        yield profiler
+    finally:
+        disable()
+
+
+def stage(name: str):
+    """
+    :param name: Name of the stage.
+    :return: Context manager measuring the stage or an empty context manager if profiling is disabled.
+    """
+    if _profiler is None:
+        return _NULL
+    return _profiler.stage(name)
+
+
+def count(name: str, value: int = 1):
+    """
+    Increases the counter if profiling is enabled.
+
+    :param name: Name of the counter.
+    :param value: Increment.
+    """
+    if _profiler is not None:
+        _profiler.count(name, value)
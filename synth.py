@@ -1,50 +1,315 @@
 """
-Module for playing notes in real time based fluidsynth.
+Module for playing notes in real time or rendering them offline based fluidsynth.
+fluidsynth is imported on first use, so this module can be imported without libfluidsynth.
 """
+import time
+import wave
+from collections import deque
 from time import sleep
-from typing import List
+from typing import Callable, List
 
-import fluidsynth
+import numpy as np
 
-from midiUtilities import MidiTrack, transform_time
+import profiling
+from midiUtilities import MidiTrack, MidiEvents, EventTrack, TempoMap, KINDS, NOTE_ON, NOTE_OFF, to_seconds, \
+    note_events
+from midiWriter import CHANNELS
 
 
-def synth(tracks: List[MidiTrack], bmp: int, sound_font: str, loop: bool = True):
+class TimingStats:
+    """
+    Measured timing of dispatched events: lateness is the difference between the moment
+    an event was dispatched and its deadline (in seconds).
+    """
+
+    def __init__(self, size: int = 100000):
+        """
+        :param size: Number of last events kept for statistics.
+        """
+        self.deadlines = deque(maxlen=size)
+        self.lateness = deque(maxlen=size)
+        self.count = 0
+
+    def add(self, deadline: float, lateness: float):
+        self.deadlines.append(deadline)
+        self.lateness.append(lateness)
+        self.count += 1
+
+    @property
+    def mean(self) -> float:
+        return float(np.mean(self.lateness)) if self.lateness else 0.0
+
+    @property
+    def max(self) -> float:
+        return float(np.max(self.lateness)) if self.lateness else 0.0
+
+    @property
+    def jitter(self) -> float:
+        """
+        Standard deviation of lateness.
+        """
+        return float(np.std(self.lateness)) if self.lateness else 0.0
+
+    def percentile(self, q: float) -> float:
+        return float(np.percentile(self.lateness, q)) if self.lateness else 0.0
+
+    @property
+    def drift(self) -> float:
+        """
+        Change of lateness over the measured period (least squares line), in seconds.
+        """
+        if len(self.lateness) < 2 or self.deadlines[0] == self.deadlines[-1]:
+            return 0.0
+        slope = np.polyfit(np.array(self.deadlines), np.array(self.lateness), 1)[0]
+        return float(slope * (self.deadlines[-1] - self.deadlines[0]))
+
+    def __str__(self):
+        return str({"count": self.count, "mean": self.mean, "max": self.max, "p99": self.percentile(99),
+                    "jitter": self.jitter, "drift": self.drift})
+
+    __repr__ = __str__
+
+
+class RealtimeScheduler:
+    """
+    Dispatches events at absolute deadlines of a monotonic clock, so errors of sleeping
+    and the time of dispatching do not accumulate.
+    With a lookahead, events are dispatched that much before their deadlines, for a backend which
+    queues timestamped events itself (like the fluidsynth sequencer).
+    """
+
+    def __init__(self, lookahead: float = 0, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = sleep, stats: TimingStats = None):
+        """
+        :param lookahead: Seconds by which events are dispatched before their deadlines.
+        :param clock: Monotonic clock in seconds.
+        :param sleep: Sleep function.
+        :param stats: Statistics to fill. If None, then new statistics are created.
+        """
+        self.lookahead = lookahead
+        self.clock = clock
+        self.sleep = sleep
+        self.stats = stats if stats is not None else TimingStats()
+        self.running = False
+
+    def run(self, times: List[float], dispatch: Callable[[int, float], None], loop: bool = False,
+            period: float = None) -> TimingStats:
+        """
+        Dispatches events.
+
+        :param times: Sorted times of events in seconds from the beginning.
+        :param dispatch: Function of the form: dispatch(index of event, deadline on the clock).
+        :param loop: Repeat endlessly (until stop) or not.
+        :param period: Duration of one pass for the loop. If None, then the time of the last event.
+        :return: Timing statistics.
+        """
+        if period is None:
+            period = times[-1] if len(times) else 0
+        self.running = True
+        origin = self.clock() + self.lookahead
+        while self.running:
+            for i, event_time in enumerate(times):
+                deadline = origin + event_time
+                # The moment to dispatch the event.
+                target = deadline - self.lookahead
+                now = self.clock()
+                if target > now:
+                    self.sleep(target - now)
+                    now = self.clock()
+                if not self.running:
+                    break
+                dispatch(i, deadline)
+                self.stats.add(target, now - target)
+
+            if not loop or period <= 0:
+                break
+            origin += period
+        self.running = False
+        return self.stats
+
+    def stop(self):
+        """
+        Stops the run after the current event (can be called from another thread).
+        """
+        self.running = False
+
+
+def synth(tracks: List[MidiTrack | EventTrack], bmp: int | TempoMap, sound_font: str, loop: bool = True,
+          lookahead: float = 0.05, scheduler: RealtimeScheduler = None, start: float = None) -> TimingStats:
     """
     Playing notes in real time using fluidsynth..
+    Events are scheduled at absolute deadlines; with a lookahead they are queued in the fluidsynth sequencer
+    ahead of time, so delays of Python do not move notes.
 
-    :param tracks: List of MidiTracks with raw midi-messages..
-    :param bmp: Number of metronome beats per minute (= number of quarter notes per minute).
+    :param tracks: List of MidiTracks with raw midi-messages or event tracks..
+    :param bmp: Number of metronome beats per minute (= number of quarter notes per minute) or a tempo map.
     :param sound_font: The path to the sound font.
     :param loop: Play endlessly or not.
+    :param lookahead: Seconds by which events are queued ahead. If 0, then events are sent directly.
+    :param scheduler: Scheduler to use (for example, to stop it from another thread or read its statistics).
+    :param start: Position (in musical note duration) to start playing from. Notes sounding at it are started.
+    :return: Timing statistics of dispatching.
     """
-    # Combines all messages into one track without losing track information.
-    messages = []
-    for i, track in enumerate(tracks):
-        for message in track.messages:
-            # A little dark magic.
-            message.kwargs["track"] = i
-            messages.append(message)
+    kinds, notes, velocities, channels, times = _merge(tracks, bmp, start)
+
+    import fluidsynth
+    fs = fluidsynth.Synth()
+    fs.start()
+    _load(fs, tracks, sound_font)
+
+    if scheduler is None:
+        scheduler = RealtimeScheduler()
+    scheduler.lookahead = lookahead
+
+    if lookahead > 0:
+        sequencer = fluidsynth.Sequencer(time_scale=1000, use_system_timer=False)
+        destination = sequencer.register_fluidsynth(fs)
+        # The same moment on the clock of the scheduler and the sequencer (milliseconds).
+        origin, tick = scheduler.clock(), sequencer.get_tick()
+
+        def dispatch(i, deadline):
+            at = int(tick + (deadline - origin) * 1000)
+            if kinds[i] == NOTE_ON:
+                sequencer.note_on(at, channels[i], notes[i], velocities[i], dest=destination, absolute=True)
+            if kinds[i] == NOTE_OFF:
+                sequencer.note_off(at, channels[i], notes[i], dest=destination, absolute=True)
+    else:
+        def dispatch(i, deadline):
+            _send(fs, kinds[i], notes[i], velocities[i], channels[i])
+
+    return scheduler.run(times, dispatch, loop=loop)
 
-    messages = transform_time(messages, bmp=bmp, to_tick=False)
 
+def synth_stream(composition, bmp: int | TempoMap, sound_font: str):
+    """
+    Playing a composition in real time while it is compiled: events come from Composition.iter_events,
+    so the playback begins immediately and memory does not grow with the length of the composition.
+
+    :param composition: The Composition.
+    :param bmp: Number of metronome beats per minute (= number of quarter notes per minute) or a tempo map.
+    :param sound_font: The path to the sound font.
+    """
+    channels = {id_track: CHANNELS[i % len(CHANNELS)] for i, id_track in enumerate(composition.tracks)}
+
+    import fluidsynth
     fs = fluidsynth.Synth()
     fs.start()
     font = fs.sfload(sound_font)
+    for id_track, channel in channels.items():
+        fs.program_select(channel, font, 0, composition.tracks[id_track])
 
-    for i, track in enumerate(tracks):
-        fs.program_select(i, font, 0, track.instrument)
+    # Deadlines are absolute, so the time of compiling does not accumulate between events.
+    origin = time.monotonic()
+    for id_track, message in composition.iter_events():
+        delay = origin + float(to_seconds(message.time, bmp)) - time.monotonic()
+        if delay > 0:
+            sleep(delay)
+        _send(fs, KINDS.get(message.kind), message.note, message.velocity, channels[id_track])
+
+
+def render(tracks: List[MidiTrack | EventTrack], bmp: int | TempoMap, sound_font: str, path: str = None,
+           sample_rate: int = 44100, tail: float = 1, block_size: int = 4096, start: float = None) -> np.ndarray | None:
+    """
+    Renders notes offline, as fast as possible: fluidsynth runs without an audio driver and
+    blocks of samples are pulled between event timestamps.
+
+    :param tracks: List of MidiTracks with raw midi-messages or event tracks.
+    :param bmp: Number of metronome beats per minute (= number of quarter notes per minute) or a tempo map.
+    :param sound_font: The path to the sound font.
+    :param path: The path to the WAV file. If None, then samples are returned.
+    :param sample_rate: Number of samples per second.
+    :param tail: Seconds rendered after the last event (for release of notes).
+    :param block_size: Maximum number of frames pulled at once.
+    :param start: Position (in musical note duration) to render from. Notes sounding at it are started.
+    :return: Array of 16-bit stereo samples with the shape (frames, 2) or None if path is set.
+    """
+    kinds, notes, velocities, channels, times = _merge(tracks, bmp, start)
+    # Frame of every event from absolute times in seconds.
+    frames = np.rint(np.array(times) * sample_rate).astype(np.int64).tolist()
+
+    import fluidsynth
+    fs = fluidsynth.Synth(samplerate=float(sample_rate))
+    _load(fs, tracks, sound_font)
+
+    output = None
+    blocks = []
+    if path is not None:
+        output = wave.open(path, "wb")
+        output.setnchannels(2)
+        output.setsampwidth(2)
+        output.setframerate(sample_rate)
+
+    def pull(count):
+        while count > 0:
+            size = min(count, block_size)
+            with profiling.stage("synthesize"):
+                samples = np.asarray(fs.get_samples(size), dtype=np.int16)
+            profiling.count("frames_rendered", size)
+            if output is not None:
+                output.writeframes(samples.tobytes())
+            else:
+                blocks.append(samples)
+            count -= size
 
-    while True:
-        for message in messages:
-            # All magic in waiting necessary time.
-            sleep(message.time)
+    try:
+        position = 0
+        for i, frame in enumerate(frames):
+            pull(frame - position)
+            position = max(position, frame)
+            _send(fs, kinds[i], notes[i], velocities[i], channels[i])
+        pull(int(tail * sample_rate))
+    finally:
+        if output is not None:
+            output.close()
+        fs.delete()
 
-            if message.kind == "note_on":
-                fs.noteon(message.kwargs["track"], key=message.kwargs["note"], vel=message.kwargs["velocity"])
+    if output is not None:
+        return None
+    if not blocks:
+        return np.zeros((0, 2), dtype=np.int16)
+    return np.concatenate(blocks).reshape(-1, 2)
 
-            if message.kind == "note_off":
-                fs.noteoff(message.kwargs["track"], key=message.kwargs["note"])
 
-        if not loop:
-            break
+def _merge(tracks: List[MidiTrack | EventTrack], bmp: int | TempoMap,
+           start: float = None) -> (list, list, list, list, list):
+    """
+    Combines note events of all tracks into one time-ordered stream without losing track information.
+    The tracks are not changed, so they can be used again.
+
+    :param start: If set, only events from this position are taken (see NoteIndex.slice)
+                  and times are counted from it.
+    :return: Tuple of the form: (kinds, notes, velocities, channels, absolute times in seconds) of ordered events.
+    """
+    offset = 0.0
+    if start:
+        from timeIndex import NoteIndex
+        tracks = NoteIndex(tracks).musical_slice(start, rebase=False)
+        offset = float(to_seconds(start, bmp))
+
+    events = [note_events(track) for track in tracks]
+    # Tracks take the same channels as in written midi-files, so no track plays as drums.
+    channels = np.repeat(np.resize(CHANNELS, len(events)), [len(block) for block in events])
+    events = MidiEvents.concatenate(events)
+    order = np.argsort(events.time, kind="stable")
+    return (events.kind[order].tolist(), events.note[order].tolist(), events.velocity[order].tolist(),
+            channels[order].tolist(), (to_seconds(events.time[order], bmp) - offset).tolist())
+
+
+def _load(fs, tracks: List[MidiTrack | EventTrack], sound_font: str):
+    """
+    Loads the sound font and selects the instrument of every track.
+    """
+    font = fs.sfload(sound_font)
+    for i, track in enumerate(tracks):
+        fs.program_select(CHANNELS[i % len(CHANNELS)], font, 0, track.instrument)
+
+
+def _send(fs, kind: int, note: int, velocity: int, channel: int):
+    """
+    Sends one note event to fluidsynth.
+    """
+    if kind == NOTE_ON:
+        fs.noteon(channel, key=note, vel=velocity)
+
+    if kind == NOTE_OFF:
+        fs.noteoff(channel, key=note)
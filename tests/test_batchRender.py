@@ -0,0 +1,59 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+import mido
+
+from batchRender import main, read_jobs, render_all
+
+SCRIPT = """
+from composition import Composition, Sequence
+from note import Note
+
+bmp = {bmp}
+composition = Composition()
+composition.add_track("p", 0)
+composition.add_sequence(Sequence([Note(0, 4, velocity=64, duration=1 / 4, delay=0, start_end=False)] * {count}, "p"))
+"""
+
+
+class TestBatchRender(TestCase):
+    def test_render(self):
+        with tempfile.TemporaryDirectory() as path:
+            songs, out = os.path.join(path, "songs"), os.path.join(path, "out")
+            os.mkdir(songs)
+            for i in range(5):
+                with open(os.path.join(songs, "song{}.py".format(i)), "w") as file:
+                    file.write(SCRIPT.format(bmp=100 + i, count=i + 1))
+            with open(os.path.join(songs, "broken.py"), "w") as file:
+                file.write("composition = None\n")
+
+            summary = render_all(read_jobs([songs]), out, processes=2, queue_size=2)
+            assert summary["rendered"] == 5 and summary["skipped"] == 0 and list(summary["failed"]) == [
+                os.path.join(songs, "broken.py")]
+            assert summary["events"] == 2 * (1 + 2 + 3 + 4 + 5)
+            midi = mido.MidiFile(os.path.join(out, "song2.midi"))
+            assert len([m for m in midi.tracks[0] if m.type == "note_on"]) == 3
+            assert [m.tempo for m in midi.tracks[0] if m.type == "set_tempo"] == [mido.bpm2tempo(102)]
+            assert abs(midi.length - 3 / 4 * 4 * 60 / 102) < 1e-3
+
+            # Up-to-date outputs are skipped, a manifest can rename and retempo compositions.
+            assert main([songs, "--out", out, "--processes", "1"]) == 1
+            with open(os.path.join(path, "manifest.json"), "w") as file:
+                json.dump(["songs/song0.py", {"path": "songs/song1.py", "name": "renamed", "bmp": 60}], file)
+            summary = render_all(read_jobs([os.path.join(path, "manifest.json")]), out, processes=1)
+            assert summary["rendered"] == 1 and summary["skipped"] == 1
+            midi = mido.MidiFile(os.path.join(out, "renamed.midi"))
+            assert [m.tempo for m in midi.tracks[0] if m.type == "set_tempo"] == [mido.bpm2tempo(60)]
+
+            # Scripts with the same name in different directories do not overwrite each other.
+            other = os.path.join(path, "other")
+            os.mkdir(other)
+            with open(os.path.join(other, "song0.py"), "w") as file:
+                file.write(SCRIPT.format(bmp=100, count=7))
+            summary = render_all(read_jobs([songs, other]), out, processes=1, force=True)
+            assert summary["rendered"] == 5 and set(summary["failed"]) == {
+                os.path.join(songs, "broken.py"), os.path.join(other, "song0.py")}
+            midi = mido.MidiFile(os.path.join(out, "song0.midi"))
+            assert len([m for m in midi.tracks[0] if m.type == "note_on"]) == 1
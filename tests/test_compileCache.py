@@ -0,0 +1,52 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from compileCache import CompileCache, composition_hash
+from composition import Composition, Sequence
+from note import Note
+
+
+def _composition(velocity=64):
+    c = Composition()
+    c.add_track("1", 0)
+    c.add_track("2", 5)
+    c.add_track("empty", 7)
+    n = Note(0, 4, velocity=velocity, duration=1 / 4, delay=0, start_end=False)
+    s = c.add_sequence(Sequence([n, n + 4], "1"))
+    s += Sequence([n - 12], "2", delay=1 / 3)
+    return c
+
+
+class TestCompileCache(TestCase):
+    def test_hash(self):
+        assert composition_hash(_composition()) == composition_hash(_composition())
+        assert composition_hash(_composition()) != composition_hash(_composition(velocity=65))
+        repeated = _composition()
+        repeated.initial_sequences[0].repeat(2)
+        assert composition_hash(_composition()) != composition_hash(repeated)
+
+    def test_round_trip(self):
+        with tempfile.TemporaryDirectory() as path:
+            cache = CompileCache(path)
+            c = _composition()
+            assert cache.get(c) is None
+            expected = cache.compile(c)
+            cached = cache.get(_composition())
+
+            assert [(t.label, t.instrument) for t in cached] == [("1", 0), ("2", 5), ("empty", 7)]
+            assert all(a.events == b.events for a, b in zip(expected, cached))
+            # Arrays are views of the memory map.
+            assert not cached[0].events.time.flags.owndata
+            del cached
+
+    def test_eviction(self):
+        with tempfile.TemporaryDirectory() as path:
+            cache = CompileCache(path, max_bytes=0)
+            cache.compile(_composition())
+            assert [name for name in os.listdir(path)] == []
+
+            cache.max_bytes = 10 ** 6
+            for velocity in range(60, 64):
+                cache.compile(_composition(velocity))
+            assert len(os.listdir(path)) == 4
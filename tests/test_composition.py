@@ -1,8 +1,12 @@
+import tracemalloc
 from unittest import TestCase
 
-from composition import Sequence
+import numpy as np
+
+import profiling
+from composition import Composition, Sequence
 from midiUtilities import MidiMessage
-from note import Note
+from note import Note, NoteArray
 
 
 class TestSequence(TestCase):
@@ -21,6 +25,28 @@ class TestSequence(TestCase):
                              MidiMessage("note_on", 3, note=2, velocity=64),
                              MidiMessage("note_off", 4, note=2, velocity=64)]
 
+    def test_toMidi_columnar(self):
+        notes = [Note(0, 3, velocity=64, duration=1 / 4, delay=0, start_end=True),
+                 Note(4, 3, velocity=70, duration=1 / 8, delay=1 / 8, start_end=False),
+                 Note(7, 3, velocity=80, duration=1 / 2, delay=0, start_end=True),
+                 Note(11, 3, velocity=90, duration=1 / 4, delay=1 / 16, start_end=True)]
+        columnar = NoteArray.fromNotes(notes)
+        assert columnar.toNotes() == notes
+        assert Sequence(columnar, "1").toMidi() == Sequence(notes, "1").toMidi()
+        # Short lists are converted in a loop with the same sums as the vectorized conversion.
+        notes = [Note(i % 12, 4, velocity=64, duration=1 / (i + 3), delay=1 / (i + 7), start_end=i % 3 == 0)
+                 for i in range(20)]
+        events, duration = Sequence(notes, "1").toEvents()
+        assert events == Sequence(NoteArray.fromNotes(notes), "1").toEvents()[0]
+        assert duration == Sequence(NoteArray.fromNotes(notes), "1").toEvents()[1]
+
+        result = Sequence.fromArrays([48, 52], [64, 64], [1, 1], [0, 1], [True, False], "1").toMidi()
+        assert result[1] == 3
+        assert result[0] == [MidiMessage("note_on", 0, note=48, velocity=64),
+                             MidiMessage("note_off", 1, note=48, velocity=64),
+                             MidiMessage("note_on", 2, note=52, velocity=64),
+                             MidiMessage("note_off", 3, note=52, velocity=64)]
+
     def test_compile_with_many_tracks(self):
         n1 = Note(0, -1, velocity=64, duration=1, delay=0, start_end=True)
         n2 = Note(1, -1, velocity=64, duration=1, delay=1, start_end=False)
@@ -50,3 +76,241 @@ class TestSequence(TestCase):
                                    MidiMessage("note_off", 7, note=1, velocity=64),
                                    MidiMessage("note_on", 7, note=2, velocity=64),
                                    MidiMessage("note_off", 8, note=2, velocity=64)])
+
+    def test_compile_long_chain(self):
+        n = Note(0, -1, velocity=64, duration=1, delay=0, start_end=True)
+        first = s = Sequence([n], "1")
+        for i in range(5000):
+            s += Sequence([n], "1")
+
+        result = first.compile_events()
+        assert len(result) == 5001
+        assert result[-1][1].time.tolist() == [5000, 5001]
+
+    def test_cycle(self):
+        n = Note(0, 4, velocity=64, duration=1 / 4, delay=0, start_end=False)
+        a, b = Sequence([n], "1"), Sequence([n], "1")
+        a.next_sequences = [b]
+        b.next_sequences = [a]
+        with self.assertRaises(ValueError):
+            a.compile_events()
+        with self.assertRaises(ValueError):
+            a.compile_events(1, 2)
+        # A sequence shared by two branches is not a cycle.
+        c = Sequence([n], "1")
+        a.next_sequences, b.next_sequences = [b, c], [c]
+        assert len(a.compile_events()) == 4
+
+    def test_compile_shared_sequence(self):
+        calls = []
+
+        class CountingSequence(Sequence):
+            def toEvents(self):
+                calls.append(self)
+                return super().toEvents()
+
+        n = Note(0, -1, velocity=64, duration=1, delay=0, start_end=True)
+        shared = CountingSequence([n], "1")
+        shared.next_sequences.append(CountingSequence([n], "2"))
+        s1 = CountingSequence([n], "1", next_sequences=[shared])
+        s2 = CountingSequence([n], "1", next_sequences=[shared])
+        root = CountingSequence([n], "1", next_sequences=[s1, s2])
+
+        result = root.compile()
+        assert len(calls) == 5
+        assert [(track, [m.time for m in messages]) for track, messages in result] == \
+               [("1", [0, 1]), ("1", [1, 2]), ("1", [2, 3]), ("2", [3, 4]),
+                ("1", [1, 2]), ("1", [2, 3]), ("2", [3, 4])]
+
+
+class TestComposition(TestCase):
+    def test_parallel_compile(self):
+        c = Composition()
+        c.add_track("1", 0)
+        c.add_track("2", 1)
+        for i in range(4):
+            n = Note(i, 3, velocity=64, duration=1 / (i + 1), delay=i / 3, start_end=bool(i % 2))
+            s = c.add_sequence(Sequence([n, n], str(i % 2 + 1)))
+            for j in range(300):
+                s += Sequence([n], str(j % 2 + 1), delay=j / 7)
+
+        serial = c.compile_events()
+        parallel = c.compile_events(processes=2)
+        assert [track.label for track in parallel] == ["1", "2"]
+        assert all(a.events == b.events for a, b in zip(serial, parallel))
+
+    def test_repeat(self):
+        arpeggio = [Note(i, 4, velocity=80, duration=1 / 8, delay=1 / 16, start_end=False) for i in (0, 4, 7, 4)]
+        chord = [Note(i, 3, velocity=64, duration=1 / 4, delay=0, start_end=True) for i in (0, 4, 7)]
+
+        chained = Composition()
+        chained.add_track("1", 0)
+        s = chained.add_sequence(Sequence(arpeggio, "1"))
+        for _ in range(999):
+            s += Sequence(arpeggio, "1", delay=1 / 32)
+        s += Sequence(chord, "1")
+
+        repeated = Composition()
+        repeated.add_track("1", 0)
+        s = repeated.add_sequence(Sequence(arpeggio, "1").repeat(1000, gap=1 / 32))
+        s += Sequence(chord, "1")
+
+        expected = chained.compile_events()[0].events
+        for tracks in (repeated.compile_events(), repeated.compile_events(processes=2),
+                       repeated.compile_events(incremental=True)):
+            assert len(tracks[0].events) == len(expected)
+            assert np.allclose(np.sort(tracks[0].events.time), np.sort(expected.time))
+        assert np.allclose([message.time for _, message in repeated.iter_events()], np.sort(expected.time))
+        assert repeated.compile_events(resolution=1920)[0].events.time[-1] == round(expected.time[-1] * 1920)
+
+        # Changing repeats or gap invalidates the incremental compilation.
+        s = Sequence(chord, "1")
+        repeated = Composition()
+        repeated.add_track("1", 0)
+        repeated.add_sequence(s)
+        assert len(repeated.compile_events(incremental=True)[0].events) == 6
+        s.repeats = 3
+        assert len(repeated.compile_events(incremental=True)[0].events) == 18
+        s.gap = 1
+        assert repeated.compile_events(incremental=True)[0].events.time.max() == 2.75
+
+    def test_iter_events_memory(self):
+        def peak(count):
+            c = Composition()
+            c.add_track("1", 0)
+            n = Note(0, 4, velocity=64, duration=1 / 4, delay=0, start_end=False)
+            s = c.add_sequence(Sequence([n] * 8, "1"))
+            for _ in range(count - 1):
+                s += Sequence([n] * 8, "1")
+            tracemalloc.start()
+            try:
+                for _ in c.iter_events():
+                    pass
+                return tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        peak(50)
+        # Memory does not grow with the length of the composition.
+        assert peak(1600) < 2 * peak(400) < 200000
+
+    def test_iter_events(self):
+        c = Composition()
+        c.add_track("1", 0)
+        c.add_track("2", 1)
+        chord = [Note(i, 3, velocity=64, duration=1 / 4, delay=0, start_end=True) for i in (0, 4, 7)]
+        arpeggio = [Note(i, 4, velocity=80, duration=1 / 8, delay=0, start_end=False) for i in (0, 4, 7, 4)]
+        s = c.add_sequence(Sequence(chord, "1"))
+        s += Sequence(arpeggio, "2", delay=1 / 16)
+        s.next_sequences.append(Sequence(chord, "1", start_end=True))
+        c.add_sequence(Sequence(arpeggio, "1", delay=1 / 8))
+
+        events = list(c.iter_events())
+        times = [message.time for _, message in events]
+        assert times == sorted(times)
+
+        expected = sorted(((track.label, (m.time, m.kind, m.kwargs["note"])) for track in c.compile()
+                           for m in track.messages), key=str)
+        assert sorted(((track, (m.time, m.kind, m.kwargs["note"])) for track, m in events), key=str) == expected
+
+    def test_incremental_compile(self):
+        calls = []
+
+        class CountingSequence(Sequence):
+            def toEvents(self):
+                calls.append(self)
+                return super().toEvents()
+
+        n = Note(0, 3, velocity=64, duration=1, delay=0, start_end=True)
+        c = Composition()
+        c.add_track("1", 0)
+        sequences = [c.add_sequence(CountingSequence([n], "1"))]
+        for i in range(9):
+            sequences.append(sequences[-1] + CountingSequence([n], "1"))
+
+        c.compile_events(incremental=True)
+        assert len(calls) == 10
+        calls.clear()
+
+        sequences[4].notes = [n, Note(0, 3, velocity=64, duration=1, delay=0, start_end=False)]
+        result = c.compile_events(incremental=True)
+        assert calls == [sequences[4]]
+        assert result[0].events == c.compile_events()[0].events
+        assert result[0].events.time[-1] == 11
+
+        calls.clear()
+        sequences[7].notes[0] = Note(1, 3, velocity=64, duration=2, delay=0, start_end=True)
+        sequences[7].invalidate()
+        sequences[2].delay = 1
+        result = c.compile_events(incremental=True)
+        assert calls == [sequences[7]]
+        assert result[0].events == c.compile_events()[0].events
+        assert result[0].events.time[-1] == 13
+
+    def test_incremental_dirty_graphs(self):
+        n = Note(0, 3, velocity=64, duration=1, delay=0, start_end=False)
+        c = Composition()
+        c.add_track("1", 0)
+        c.add_track("2", 1)
+        chains = []
+        for i in range(20):
+            chain = [c.add_sequence(Sequence([n], str(i % 2 + 1), delay=i))]
+            for _ in range(9):
+                chain.append(chain[-1] + Sequence([n, n], str(i % 2 + 1)))
+            chains.append(chain)
+
+        def visited():
+            with profiling.profile() as profiler:
+                result = c.compile_events(incremental=True)
+            assert all(a.events == b.events for a, b in zip(result, c.compile_events()))
+            return profiler.counters.get("sequences_visited", 0)
+
+        assert visited() == 200
+        # Nothing changed: no graph is compiled again.
+        assert visited() == 0
+        # Only the graph of the initial sequence that contains the changed sequence is compiled again.
+        chains[3][5].delay = 2
+        assert visited() == 10
+        chains[4][2].start_end = True
+        chains[7][9].repeats = 2
+        assert visited() == 20
+        chains[5][9] + chains[6][0]
+        assert visited() == 20
+        # The sequences of chain 6 are in two graphs now.
+        chains[6][1].notes = [n]
+        assert visited() == 30
+        c.initial_sequences.pop()
+        assert visited() == 0
+        # Dropped graphs are not kept alive by their sequences.
+        assert all(sequence._blocks == [] for sequence in chains[19])
+        assert [len(sequence._blocks) for sequence in chains[6]] == [2] * 10
+        chains[5][9].next_sequences = []
+        assert visited() == 10
+        assert all(len(sequence._blocks) == 1 for sequence in chains[6])
+
+
+class TestTicks(TestCase):
+    def test_exact_timeline(self):
+        c = Composition()
+        c.add_track("1", 0)
+        # Triplets: 1/12 is not exact in float, so float times drift along the chain.
+        note = Note(0, 4, velocity=64, duration=1 / 12, delay=0, start_end=False)
+        s = c.add_sequence(Sequence([note] * 12, "1"))
+        for _ in range(999):
+            s += Sequence([note] * 12, "1")
+
+        events = c.compile_events(resolution=1920)[0]
+        assert events.resolution == 1920
+        assert events.events.time.dtype.kind == "i"
+        assert events.events.time.tolist() == [i * 160 for i in range(12000) for i in (i, i + 1)]
+        # The musical timeline is the same up to rounding.
+        musical = c.compile_events()[0].events.time
+        assert abs(events.musical_events().time - musical).max() < 1e-9
+
+    def test_not_representable(self):
+        c = Composition()
+        c.add_track("1", 0)
+        c.add_sequence(Sequence([Note(0, 4, velocity=64, duration=1 / 7, delay=0, start_end=False)], "1"))
+        with self.assertRaises(ValueError):
+            c.compile_events(resolution=1920)
+        assert c.compile_events(resolution=1920 * 7)[0].events.time.tolist() == [0, 1920]
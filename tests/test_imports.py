@@ -0,0 +1,35 @@
+import os
+import subprocess
+import sys
+import tempfile
+from unittest import TestCase
+
+# Seconds allowed for importing all modules on top of a bare import of numpy.
+STARTUP_BUDGET = 0.05
+
+SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import numpy
+numpy_time = time.perf_counter() - start
+import composition, piano, synth, midiUtilities, midiWriter, midiReader, compileCache, profiling
+print(numpy_time, time.perf_counter() - start)
+print(",".join(name for name in ("mido", "fluidsynth", "multiprocessing") if name in sys.modules))
+"""
+
+
+class TestImports(TestCase):
+    def test_startup(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        with tempfile.TemporaryDirectory() as cache:
+            # Bytecode is cached outside the repository, and the first run only fills the cache,
+            # so the second one measures imports as they are after installation.
+            env = dict(os.environ, PYTHONPYCACHEPREFIX=cache)
+            env.pop("PYTHONDONTWRITEBYTECODE", None)
+            for _ in range(2):
+                output = subprocess.run([sys.executable, "-c", SCRIPT], cwd=root, env=env, capture_output=True,
+                                        text=True, check=True).stdout.split("\n")
+        # Backends are loaded on first use only.
+        assert output[1] == ""
+        numpy_time, total = map(float, output[0].split())
+        assert total < numpy_time + STARTUP_BUDGET
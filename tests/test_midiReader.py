@@ -0,0 +1,105 @@
+import os
+import struct
+import tempfile
+from unittest import TestCase
+
+import mido
+import numpy as np
+
+from composition import Composition, Sequence
+from midiReader import read_file, read_files
+from midiUtilities import write_to_file
+from note import Note
+
+
+class TestReader(TestCase):
+    def test_round_trip(self):
+        c = Composition()
+        c.add_track("piano", 0)
+        c.add_track("bass", 33)
+        chord = [Note(i, 4, velocity=60 + i, duration=1 / 4, delay=0, start_end=True) for i in (0, 4, 7)]
+        s = c.add_sequence(Sequence(chord, "piano"))
+        s += Sequence([Note(0, 2, velocity=90, duration=1 / 2, delay=1 / 8, start_end=False)] * 3, "bass")
+        s += Sequence(chord, "piano", delay=1 / 16)
+
+        with tempfile.TemporaryDirectory() as path:
+            write_to_file(c.compile_events(), path, bmp=120, single_file=True)
+            result = read_file(os.path.join(path, "composition.midi"))
+            with open(os.path.join(path, "broken.midi"), "wb") as file:
+                file.write(b"not a midi-file")
+            results = list(read_files([os.path.join(path, name) for name in ("composition.midi", "broken.midi",
+                                                                             "missing.midi", "composition.midi")],
+                                      processes=1, chunk_size=1))
+            assert [result.tracks for result in results[::3]] == [result.tracks] * 2
+            assert isinstance(results[1], ValueError) and isinstance(results[2], OSError)
+
+        assert result.tracks == {"piano": 0, "bass": 33}
+        for expected, actual in zip(c.compile_events(), result.compile_events()):
+            order = np.lexsort((expected.events.note, expected.events.time))
+            assert np.allclose(expected.events.time[order], np.sort(actual.events.time))
+            assert sorted(expected.events.note.tolist()) == sorted(actual.events.note.tolist())
+            assert sorted(expected.events.velocity.tolist()) == sorted(actual.events.velocity.tolist())
+
+    def test_tempo(self):
+        c = Composition()
+        c.add_track("piano", 0)
+        c.add_track("bass", 33)
+        c.set_tempo(90, 1 / 2)
+        c.set_tempo(150, 3 / 2)
+        s = c.add_sequence(Sequence([Note(0, 4, velocity=64, duration=1 / 4, delay=0, start_end=False)] * 8, "piano"))
+        s += Sequence([Note(0, 2, velocity=64, duration=1 / 2, delay=0, start_end=False)] * 2, "bass")
+        tempo = c.tempo_map(100)
+
+        with tempfile.TemporaryDirectory() as path:
+            write_to_file(c.compile_events(), path, bmp=tempo, ticks_per_beat=96, single_file=True)
+            write_to_file(c.compile_events(), path, bmp=tempo, ticks_per_beat=96)
+            midi = mido.MidiFile(os.path.join(path, "composition.midi"))
+            bass = mido.MidiFile(os.path.join(path, "bass.midi"))
+            result = read_file(os.path.join(path, "composition.midi"))
+
+        # mido applies set_tempo events when it converts ticks to seconds.
+        seconds, global_time = [], 0
+        for message in midi:
+            global_time += message.time
+            if message.type == "note_on":
+                seconds.append(global_time)
+        times = np.sort(np.concatenate([track.events.time[track.events.kind == 0x90]
+                                        for track in c.compile_events()]))
+        assert np.allclose(seconds, tempo.seconds(times))
+        assert [m.tempo for m in bass.tracks[0] if m.type == "set_tempo"] == [600000, 666667, 400000]
+        # Tempos are stored in whole microseconds per beat.
+        assert np.allclose(result.tempos, [(0, 100), (1 / 2, 90), (3 / 2, 150)], rtol=1e-6)
+
+    def test_running_status_and_zero_velocity(self):
+        midi = mido.MidiFile(type=0, ticks_per_beat=96)
+        track = mido.MidiTrack()
+        track.append(mido.Message("program_change", channel=2, program=5, time=0))
+        track.append(mido.Message("note_on", channel=2, note=60, velocity=70, time=0))
+        track.append(mido.Message("note_on", channel=2, note=60, velocity=80, time=96))
+        track.append(mido.Message("note_on", channel=2, note=60, velocity=0, time=96))
+        track.append(mido.Message("note_on", channel=2, note=60, velocity=0, time=96))
+        midi.tracks.append(track)
+
+        with tempfile.TemporaryDirectory() as path:
+            midi.save(os.path.join(path, "a.mid"))
+            result = read_file(os.path.join(path, "a.mid"))
+
+        assert result.tracks == {"0": 5}
+        notes = result.initial_sequences[0].notes
+        assert notes.pitch.tolist() == [60, 60]
+        assert notes.duration.tolist() == [1 / 2, 1 / 2]
+        assert notes.delay.tolist() == [0, 1 / 4]
+
+    def test_running_status_after_meta(self):
+        # note_on, a marker meta event, then note_off by running status of note_on.
+        data = bytes([0x00, 0x91, 60, 70, 0x00, 0xFF, 0x06, 0x01, 0x41, 0x60, 60, 0x00, 0x00, 0xFF, 0x2F, 0x00])
+        with tempfile.TemporaryDirectory() as path:
+            with open(os.path.join(path, "a.mid"), "wb") as file:
+                file.write(b"MThd" + struct.pack(">LHHH", 6, 0, 1, 96) + b"MTrk" + struct.pack(">L", len(data)) + data)
+            result = read_file(os.path.join(path, "a.mid"))
+            assert [m.type for m in mido.MidiFile(os.path.join(path, "a.mid")).tracks[0]] == \
+                   ["note_on", "marker", "note_on", "end_of_track"]
+
+        notes = result.initial_sequences[0].notes
+        assert notes.pitch.tolist() == [60]
+        assert notes.duration.tolist() == [1 / 4]
@@ -0,0 +1,60 @@
+from unittest import TestCase
+
+import mido
+import numpy as np
+
+from midiUtilities import MidiMessage, MidiEvents, TempoMap, transform_time, transform_events
+
+
+class TestMidiMessage(TestCase):
+    def test_fields(self):
+        message = MidiMessage("note_on", 1, note=60, velocity=64)
+        assert message.kwargs == {"note": 60, "velocity": 64}
+        assert message == MidiMessage("note_on", 1, velocity=64, note=60)
+        assert message != MidiMessage("note_on", 1, note=60)
+        assert MidiMessage("program_change", 0, program=3).kwargs == {"program": 3}
+        assert MidiMessage("program_change", 0, program=3).toMido().program == 3
+        # Arguments are read-only, so a change cannot be lost silently.
+        with self.assertRaises(TypeError):
+            message.kwargs["note"] = 62
+
+
+class TestTransformTime(TestCase):
+    def test_transform_time(self):
+        times = [0, 1 / 3, 1 / 4, 1 / 4, 2 / 3, 7 / 5]
+        messages = [MidiMessage("note_on", time, note=i, velocity=64) for i, time in enumerate(times)]
+
+        # Reference: sort, relative times, seconds and mido.second2tick for every message.
+        expected = sorted(messages, key=lambda x: x.time)
+        ticks, global_time = [], 0
+        for message in expected:
+            seconds = (message.time - global_time) / (100 / (4 * 60))
+            global_time = message.time
+            ticks.append(int(mido.second2tick(seconds, ticks_per_beat=480, tempo=1 / (100 / 60) * 10 ** 6)))
+
+        result = transform_time(messages, bmp=100)
+        assert [message.time for message in result] == ticks
+        assert [message.kwargs["note"] for message in result] == [0, 2, 3, 1, 4, 5]
+        # The input messages are not changed.
+        assert [message.time for message in messages] == times
+
+    def test_transform_events(self):
+        events = MidiEvents([1 / 2, 0, 1 / 2, 1], [0x90, 0x90, 0x80, 0x80], [60, 62, 62, 60], [64, 64, 64, 64])
+        result = transform_events(events, bmp=120, to_tick=False)
+        assert result.time.tolist() == [0, 1, 0, 1]
+        assert result.note.tolist() == [62, 60, 62, 60]
+        assert np.array_equal(events.time, [1 / 2, 0, 1 / 2, 1])
+
+
+class TestTempoMap(TestCase):
+    def test_seconds(self):
+        tempo = TempoMap(120, [(2, 60), (1, 240), (2, 30)])
+        # The later change at the same position wins.
+        assert tempo.bmps.tolist() == [120, 240, 30]
+        assert tempo.seconds([0, 1, 1.5, 2, 3]).tolist() == [0, 2, 2.5, 3, 11]
+
+        events = MidiEvents([2, 0, 3, 1], [0x90, 0x90, 0x80, 0x80], [60, 62, 60, 62], [64, 64, 64, 64])
+        assert transform_events(events, bmp=tempo, to_tick=False).time.tolist() == [0, 2, 1, 8]
+        # Ticks do not depend on the tempo.
+        assert transform_events(events, bmp=tempo, ticks_per_beat=96).time.tolist() == [0, 384, 384, 384]
+        assert tempo.tempo_events(96) == [(0, 500000), (384, 250000), (768, 2000000)]
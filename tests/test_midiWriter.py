@@ -0,0 +1,95 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import mido
+
+from composition import Composition, Sequence
+from midiUtilities import MidiMessage, MidiEvents, MidiTrack, TempoMap, transform_time, write_to_file
+from note import Note
+
+
+def _composition():
+    c = Composition()
+    c.add_track("a", 0)
+    c.add_track("b", 33)
+    notes = [Note(0, 4, velocity=64, duration=1 / 4, delay=0, start_end=True),
+             Note(4, 4, velocity=80, duration=1 / 8, delay=0, start_end=True),
+             Note(7, 4, velocity=90, duration=3, delay=1 / 3, start_end=False)]
+    s = c.add_sequence(Sequence(notes, "a"))
+    s += Sequence(notes, "b", delay=100)
+    return c
+
+
+class TestWriter(TestCase):
+    def test_same_as_mido(self):
+        tracks = _composition().compile()
+        with tempfile.TemporaryDirectory() as path:
+            write_to_file(tracks, path, bmp=90)
+            for track in tracks:
+                midi = mido.MidiFile()
+                midi.tracks.append(MidiTrack(track.label, track.instrument,
+                                             transform_time(track.messages, bmp=90)).toMido())
+                midi.save(os.path.join(path, "mido.midi"))
+                with open(os.path.join(path, track.label + ".midi"), "rb") as native, \
+                        open(os.path.join(path, "mido.midi"), "rb") as reference:
+                    assert native.read() == reference.read()
+
+    def test_single_file(self):
+        c = _composition()
+        with tempfile.TemporaryDirectory() as path:
+            write_to_file(c.compile_events(), path, bmp=90, ticks_per_beat=96, single_file=True, name="song")
+            assert os.listdir(path) == ["song.midi"]
+            midi = mido.MidiFile(os.path.join(path, "song.midi"))
+
+        assert midi.type == 1 and midi.ticks_per_beat == 96
+        assert [m.tempo for track in midi.tracks for m in track if m.type == "set_tempo"] == [mido.bpm2tempo(90)]
+        assert [track.name for track in midi.tracks] == ["a", "b"]
+        programs = [(m.channel, m.program) for track in midi.tracks for m in track if m.type == "program_change"]
+        assert programs == [(0, 0), (1, 33)]
+        notes = [m for m in midi.tracks[1] if m.type == "note_on"]
+        assert [m.channel for m in notes] == [1, 1, 1]
+        # The second sequence starts after the first one (83/24) and its delay (100).
+        assert notes[0].time == round((83 / 24 + 100) * 4 * 96)
+
+    def test_ticks(self):
+        c = _composition()
+        with tempfile.TemporaryDirectory() as path:
+            write_to_file(c.compile_events(), path, bmp=120, ticks_per_beat=96, single_file=True, name="float")
+            # Exact 1/3 needs a multiple of 3 ticks per whole note.
+            write_to_file(c.compile_events(resolution=4 * 96 * 3), path, bmp=120, ticks_per_beat=96,
+                          single_file=True, name="rescaled")
+            float_file = mido.MidiFile(os.path.join(path, "float.midi"))
+            rescaled = mido.MidiFile(os.path.join(path, "rescaled.midi"))
+
+        assert [m.tempo for m in float_file.tracks[0] if m.type == "set_tempo"] == [mido.bpm2tempo(120)]
+        for first, second in zip(float_file.tracks, rescaled.tracks):
+            assert [(m.type, m.time) for m in first] == [(m.type, m.time) for m in second]
+
+    def test_other_messages(self):
+        messages = [MidiMessage("note_on", 0, note=60, velocity=64),
+                    MidiMessage("control_change", 0.5, control=64, value=127),
+                    MidiMessage("pitchwheel", 0.75, pitch=1000),
+                    MidiMessage("note_on", 1, note=62, velocity=64, channel=3),
+                    MidiMessage("note_off", 1.5, note=62, velocity=64, channel=3),
+                    MidiMessage("control_change", 1.75, control=64, value=0),
+                    MidiMessage("note_off", 2, note=60, velocity=64)]
+        with self.assertRaises(ValueError):
+            MidiEvents.fromMessages(messages)
+
+        track = MidiTrack("a", 5, messages)
+        with tempfile.TemporaryDirectory() as path:
+            write_to_file([track], path, bmp=90)
+            midi = mido.MidiFile()
+            midi.tracks.append(MidiTrack("a", 5, transform_time(messages, bmp=90)).toMido())
+            midi.save(os.path.join(path, "mido.midi"))
+            with open(os.path.join(path, "a.midi"), "rb") as native, \
+                    open(os.path.join(path, "mido.midi"), "rb") as reference:
+                assert native.read() == reference.read()
+
+            write_to_file([track], path, bmp=TempoMap(120, [(1, 60)]), ticks_per_beat=96)
+            written = [m for m in mido.MidiFile(os.path.join(path, "a.midi")).tracks[0] if m.type != "end_of_track"]
+        assert [(m.type, m.time) for m in written] == [
+            ("program_change", 0), ("set_tempo", 0), ("note_on", 0), ("control_change", 192), ("pitchwheel", 96),
+            ("set_tempo", 96), ("note_on", 0), ("note_off", 192), ("control_change", 96), ("note_off", 96)]
+        assert [m.channel for m in written if m.type == "note_on"] == [0, 3]
@@ -0,0 +1,59 @@
+import copy
+import pickle
+import random
+from unittest import TestCase
+
+import numpy as np
+
+from note import BasicNote, Note, NoteArray, pitch
+
+
+class TestNote(TestCase):
+    def test_transpose(self):
+        note = Note(11, 3, velocity=64, duration=1 / 4, delay=0, start_end=True)
+        result = note + 13
+        assert type(result) is Note and result == Note(0, 5, velocity=64, duration=1 / 4, delay=0, start_end=True)
+        assert note - 12 == Note(11, 2, velocity=64, duration=1 / 4, delay=0, start_end=True)
+        assert not hasattr(note, "__dict__")
+
+    def test_pitch(self):
+        assert pitch(0, 4) is pitch("C", 4) is pitch(60)
+        assert pitch(60) + 7 is pitch(67)
+        assert pitch(60) == BasicNote(0, 4) and BasicNote(0, 4) == pitch(60)
+        assert copy.copy(pitch(60)) is pitch(60) and pickle.loads(pickle.dumps(pitch(60))) is pitch(60)
+        with self.assertRaises(AttributeError):
+            pitch(60).octave = 3
+
+    def test_subclass(self):
+        class Drum(Note):
+            def __init__(self, kit, *args):
+                super().__init__(*args)
+                self.kit = kit
+
+        drum = Drum("rock", 6, 2, 100, 1 / 8, 0, False)
+        result = drum + 1
+        assert type(result) is Drum and result.kit == "rock" and result.copy().kit == "rock"
+        assert result == Note(7, 2, 100, 1 / 8, 0, False) and drum.note == 6
+
+
+
+class TestNoteArray(TestCase):
+    def test_onsets_tolerance(self):
+        random.seed(0)
+        notes = [Note(0, 4, velocity=64, duration=random.choice((1 / 3, 1 / 5, 1 / 7, 0.1)),
+                      delay=random.choice((0, 1 / 12, 1 / 10)), start_end=random.random() < 0.3)
+                 for _ in range(10000)]
+        # The note-by-note loop of the original Sequence.toMidi.
+        expected, time = [], 0
+        for i, note in enumerate(notes):
+            time = note.delay if i == 0 else time + note.delay - int(note.start_end) * notes[i - 1].duration
+            expected.append(time)
+            time += note.duration
+            expected.append(time)
+
+        starts, ends = NoteArray.fromNotes(notes).onsets()
+        actual = np.empty(2 * len(notes))
+        actual[0::2], actual[1::2] = starts, ends
+        # Not bit-identical, but within the documented tolerance.
+        assert not np.array_equal(actual, expected)
+        assert np.allclose(actual, expected, rtol=len(notes) * np.finfo(np.float64).eps, atol=0)
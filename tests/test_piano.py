@@ -1,7 +1,10 @@
-from unittest import TestCase
+from unittest import TestCase, mock
 
+import numpy as np
+
+from composition import Sequence
 from note import NOTES, BasicNote, Note
-from piano import PianoChord, Piano
+from piano import PianoChord, Piano, chord_voicing
 
 
 class TestPianoChord(TestCase):
@@ -11,6 +14,32 @@ class TestPianoChord(TestCase):
             assert PianoChord(name, 3, is_normalized=False).notes == [note, note + 4, note + 7]
             assert PianoChord(name + "m", 3, is_normalized=False).notes == [note, note + 3, note + 7]
 
+    def test_qualities(self):
+        c = BasicNote(0, 3)
+        assert PianoChord("C7").notes == [c, c + 4, c + 7, c + 10]
+        assert PianoChord("Cdim").notes == [c, c + 3, c + 6]
+        assert PianoChord("Caug").notes == [c, c + 4, c + 8]
+        assert PianoChord("Csus4").notes == [c, c + 5, c + 7]
+        assert PianoChord("Am").notes == [c, c + 4, c + 9]
+        with self.assertRaises(ValueError):
+            PianoChord("Cxyz")
+
+    def test_inversions(self):
+        c = BasicNote(0, 3)
+        assert PianoChord("C", inversion=1).notes == [c + 4, c + 7, c + 12]
+        assert PianoChord("C/E").notes == [c + 4, c + 7, c + 12]
+        assert PianoChord("C/G").notes == [c + 7, c + 12, c + 16]
+        assert PianoChord("C/D").notes == [c - 10, c, c + 4, c + 7]
+
+    def test_shared_voicing(self):
+        assert chord_voicing("Em7", 3) is chord_voicing("Em7", 3)
+        chord = PianoChord("Em7")
+        chord.normalize()
+        assert PianoChord("Em7").notes == list(chord_voicing("Em7"))
+        # A repeated chord is built from the cache only.
+        with mock.patch("piano.parse_chord", side_effect=AssertionError):
+            assert PianoChord("Em7").tonic == BasicNote(4, 3)
+
 
 class TestPiano(TestCase):
     def test_play_chord(self):
@@ -23,3 +52,23 @@ class TestPiano(TestCase):
 
         assert Piano.play_chord([BasicNote(0, 3), BasicNote(1, 3)], velocity=2*[64, 100], duration=2*[1, 2],
                                 delay=2*[0, 8], start_end=2*[True, False], order=2*[0, 1]) == 2*[note1, note2]
+
+    def test_play_progression(self):
+        chords = [PianoChord("E"), PianoChord("Am"), "D7", [BasicNote(0, 3), BasicNote(4, 3)]]
+        durations = [1 / 4, 1 / 8, [1 / 4, 1 / 8, 1 / 8, 1 / 2], 1 / 16]
+        start_ends = [True, False, True, False]
+        orders = [None, 2 * [0, 1, 2, 1], None, [1, 0]]
+
+        first = s = Sequence(Piano.play_chord(chords[0], durations[0], start_end=start_ends[0]), "p")
+        for chord, duration, start_end, order in zip(chords[1:], durations[1:], start_ends[1:], orders[1:]):
+            chord = PianoChord(chord) if isinstance(chord, str) else chord
+            s += Sequence(Piano.play_chord(chord, duration, start_end=start_end, order=order), "p")
+
+        notes = Piano.play_progression(chords, durations, start_end=start_ends,
+                                       order=[[0, 1, 2]] + orders[1:2] + [[0, 1, 2, 3], [1, 0]])
+        assert len(notes) == 3 + 8 + 4 + 2
+        expected = [message for _, messages in first.compile() for message in messages]
+        assert Sequence(notes, "p").toMidi()[0] == expected
+
+        curve = Piano.play_progression(["C", "G"], velocity=np.linspace(40, 100, 6))
+        assert curve.velocity.tolist() == [40, 52, 64, 76, 88, 100]
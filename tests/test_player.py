@@ -0,0 +1,111 @@
+import asyncio
+from unittest import TestCase
+
+from composition import Composition, Sequence
+from midiUtilities import MidiMessage
+from note import Note
+from player import Player, SharedSynth
+
+
+class FakeSynth:
+    def __init__(self):
+        self.calls = []
+
+    def sfload(self, path):
+        return 1
+
+    def program_select(self, channel, font, bank, program):
+        self.calls.append(("program", channel, program))
+
+    def noteon(self, channel, key, velocity):
+        self.calls.append(("on", channel, key))
+
+    def noteoff(self, channel, key):
+        self.calls.append(("off", channel, key))
+
+
+def _tracks():
+    c = Composition()
+    c.add_track("1", 3)
+    n = Note(0, 4, velocity=64, duration=1 / 4, delay=0, start_end=False)
+    c.add_sequence(Sequence([n, n + 2], "1"))
+    return c.compile_events()
+
+
+class TestPlayer(TestCase):
+    def test_play(self):
+        fake = FakeSynth()
+        synth = SharedSynth("font.sf2", synth=fake)
+
+        async def main():
+            # 1/4 of a whole note lasts 0.01 second.
+            first = Player(_tracks(), bmp=6000, synth=synth)
+            second = Player(_tracks(), bmp=6000, synth=synth)
+            await asyncio.gather(first.start(), second.start())
+            return first, second
+
+        first, second = asyncio.run(main())
+        assert first.channels == [0] and second.channels == [1]
+        assert [call for call in fake.calls if call[1] == 0] == [("program", 0, 3), ("on", 0, 60), ("off", 0, 60),
+                                                                 ("on", 0, 62), ("off", 0, 62)]
+        assert first.position == 0 and not first.playing
+
+    def test_other_messages(self):
+        fake = FakeSynth()
+        track = _tracks()[0].toMidiTrack()
+        track.messages.insert(0, MidiMessage("program_change", 0, program=5))
+        track.messages.append(MidiMessage("control_change", 1 / 8, control=7, value=100))
+        player = Player([track], bmp=6000, synth=SharedSynth(synth=fake))
+
+        # Only notes are played.
+        assert player.kinds == Player(_tracks(), bmp=6000, synth=SharedSynth(synth=FakeSynth())).kinds
+
+        async def main():
+            await player.start()
+
+        asyncio.run(main())
+        assert fake.calls == [("program", 0, 3), ("on", 0, 60), ("off", 0, 60), ("on", 0, 62), ("off", 0, 62)]
+
+    def test_pause_seek_stop(self):
+        fake = FakeSynth()
+        synth = SharedSynth(synth=fake)
+
+        async def main():
+            player = Player(_tracks(), bmp=600, synth=synth, loop=True)
+            task = player.start()
+            await asyncio.sleep(0.05)
+            player.pause()
+            assert fake.calls[-1] == ("off", 0, 60)
+            calls = len(fake.calls)
+            await asyncio.sleep(0.15)
+            assert len(fake.calls) == calls
+            player.seek(seconds=0.1)
+            player.start()
+            await asyncio.sleep(0.03)
+            assert ("on", 0, 62) in fake.calls[calls:] and ("on", 0, 60) not in fake.calls[calls:]
+            # Looped playback goes on after the end.
+            await asyncio.sleep(0.2)
+            assert fake.calls.count(("on", 0, 60)) == 2
+            player.stop()
+            await asyncio.gather(task, return_exceptions=True)
+            assert task.cancelled() and player.position == 0
+            player.close()
+            assert synth.free[0] == 0
+
+        asyncio.run(main())
+
+    def test_seek_into_note(self):
+        fake = FakeSynth()
+        synth = SharedSynth(synth=fake)
+
+        async def main():
+            player = Player(_tracks(), bmp=600, synth=synth)
+            player.seek(0.15)
+            task = player.start()
+            await asyncio.sleep(0)
+            # The note 62 sounds from 0.1 to 0.2, so it is started at the seek position.
+            assert fake.calls == [("program", 0, 3), ("on", 0, 62)]
+            await asyncio.gather(task)
+            assert fake.calls[-1] == ("off", 0, 62) and ("on", 0, 60) not in fake.calls
+
+        asyncio.run(main())
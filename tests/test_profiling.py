@@ -0,0 +1,39 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+import profiling
+from composition import Composition, Sequence
+from midiUtilities import write_to_file
+from note import Note
+
+
+class TestProfiling(TestCase):
+    def test_pipeline(self):
+        c = Composition()
+        c.add_track("1", 0)
+        n = Note(0, 4, velocity=64, duration=1 / 4, delay=0, start_end=False)
+        s = c.add_sequence(Sequence([n, n], "1"))
+        for i in range(9):
+            s += Sequence([n, n], "1")
+
+        with tempfile.TemporaryDirectory() as path:
+            with profiling.profile(allocations=True) as profiler:
+                tracks = c.compile()
+                write_to_file(tracks, path, bmp=120)
+            profiler.export_trace(os.path.join(path, "trace.json"))
+            with open(os.path.join(path, "trace.json")) as file:
+                trace = json.load(file)
+            size = os.path.getsize(os.path.join(path, "1.midi"))
+
+        assert profiler.counters["sequences_visited"] == 10
+        assert profiler.counters["events_compiled"] == 40
+        assert profiler.counters["messages_created"] == 40
+        assert profiler.counters["bytes_written"] == size
+        assert {"compile", "toEvents", "transform_time", "encode", "write_file"} <= set(profiler.stages)
+        assert profiler.stages["toEvents"]["calls"] == 10
+        assert any(event["name"] == "compile" for event in trace["traceEvents"])
+
+        assert profiling.current() is None
+        assert profiling.stage("compile") is profiling.stage("encode")
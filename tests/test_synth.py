@@ -0,0 +1,169 @@
+import os
+import sys
+import tempfile
+import types
+import wave
+from unittest import TestCase, mock
+
+import numpy as np
+
+from composition import Composition, Sequence
+from synth import RealtimeScheduler, TimingStats, render
+
+
+class FakeClock:
+    """
+    Clock where every sleep oversleeps by a fixed amount.
+    """
+
+    def __init__(self, overshoot):
+        self.now = 0.0
+        self.overshoot = overshoot
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds + self.overshoot
+
+
+class FakeFluidSynth:
+    """
+    Synth without audio: every pulled sample is the number of its frame, and events remember
+    the number of frames pulled before them.
+    """
+
+    def __init__(self, samplerate=44100.0):
+        self.samplerate = samplerate
+        self.frames = 0
+        self.calls = []
+        self.deleted = False
+        FakeFluidSynth.last = self
+
+    def sfload(self, path):
+        return 1
+
+    def program_select(self, channel, font, bank, program):
+        self.calls.append(("program", channel, program))
+
+    def noteon(self, channel, key, vel):
+        self.calls.append(("on", self.frames, channel, key))
+
+    def noteoff(self, channel, key):
+        self.calls.append(("off", self.frames, channel, key))
+
+    def get_samples(self, size):
+        samples = np.repeat(np.arange(self.frames, self.frames + size) % 30000, 2)
+        self.frames += size
+        return samples
+
+    def delete(self):
+        self.deleted = True
+
+
+class TestRender(TestCase):
+    def setUp(self):
+        module = types.ModuleType("fluidsynth")
+        module.Synth = FakeFluidSynth
+        patcher = mock.patch.dict(sys.modules, {"fluidsynth": module})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_render(self):
+        c = Composition()
+        c.add_track("a", 3)
+        c.add_track("b", 5)
+        c.add_sequence(Sequence.fromArrays([60, 62], [64, 64], [1 / 4, 1 / 4], [0, 0], [False, False], "a"))
+        c.add_sequence(Sequence.fromArrays([48], [64], [1 / 2], [1 / 8], [False], "b"))
+        tracks = c.compile_events()
+
+        # A whole note lasts 2 seconds, 1000 frames per second.
+        samples = render(tracks, 120, "font.sf2", sample_rate=1000, tail=0.5, block_size=64)
+        fs = FakeFluidSynth.last
+        assert fs.samplerate == 1000 and fs.deleted
+        assert fs.calls == [("program", 0, 3), ("program", 1, 5), ("on", 0, 0, 60), ("on", 250, 1, 48),
+                            ("off", 500, 0, 60), ("on", 500, 0, 62), ("off", 1000, 0, 62), ("off", 1250, 1, 48)]
+        # The tail follows the last event.
+        assert samples.shape == (1750, 2)
+        assert samples[:, 0].tolist() == list(range(1750))
+
+        assert render([track.toMidiTrack() for track in tracks], 120, "font.sf2", sample_rate=1000,
+                      tail=0.5).tolist() == samples.tolist()
+        assert FakeFluidSynth.last.calls == fs.calls
+
+        with tempfile.TemporaryDirectory() as path:
+            assert render(c.compile_events(resolution=1920), 120, "font.sf2", path=os.path.join(path, "a.wav"),
+                          sample_rate=1000, tail=0.5) is None
+            assert FakeFluidSynth.last.calls == fs.calls
+            with wave.open(os.path.join(path, "a.wav"), "rb") as file:
+                assert (file.getnchannels(), file.getsampwidth(), file.getframerate()) == (2, 2, 1000)
+                assert file.getnframes() == 1750
+
+        # Notes sounding at the start begin at the first frame.
+        samples = render(tracks, 120, "font.sf2", sample_rate=1000, tail=0.5, start=3 / 8)
+        assert FakeFluidSynth.last.calls[2:] == [("on", 0, 0, 62), ("on", 0, 1, 48), ("off", 250, 0, 62),
+                                                 ("off", 500, 1, 48)]
+        assert len(samples) == 1000
+
+    def test_channels(self):
+        c = Composition()
+        for i in range(17):
+            c.add_track(i, i)
+            c.add_sequence(Sequence.fromArrays([60 + i], [64], [1 / 4], [0], [False], i))
+        render(c.compile_events(), 120, "font.sf2", sample_rate=1000, tail=0)
+        calls = FakeFluidSynth.last.calls
+
+        # The drum channel is skipped, and channels repeat after the last one.
+        channels = [channel for channel in range(16) if channel != 9] + [0, 1]
+        assert calls[:17] == [("program", channel, i) for i, channel in enumerate(channels)]
+        assert sorted(call[2:] for call in calls[17:] if call[0] == "on") == sorted(
+            (channel, 60 + i) for i, channel in enumerate(channels))
+
+
+class TestRealtimeScheduler(TestCase):
+    def test_no_drift(self):
+        clock = FakeClock(0.002)
+        scheduler = RealtimeScheduler(clock=clock, sleep=clock.sleep)
+        times = [(i + 1) * 0.01 for i in range(1000)]
+        dispatched = []
+        stats = scheduler.run(times, lambda i, deadline: dispatched.append((i, deadline)))
+
+        assert [i for i, _ in dispatched] == list(range(1000))
+        assert stats.count == 1000
+        # Oversleeping does not accumulate: every event is late by the overshoot only.
+        assert abs(stats.max - 0.002) < 1e-9
+        assert abs(stats.drift) < 1e-9
+        assert stats.jitter < 1e-9
+        assert abs(clock.now - times[-1] - 0.002) < 1e-9
+
+    def test_lookahead(self):
+        clock = FakeClock(0)
+        scheduler = RealtimeScheduler(lookahead=0.1, clock=clock, sleep=clock.sleep)
+        moments = []
+        scheduler.run([0, 0.5, 1], lambda i, deadline: moments.append((clock.now, deadline)))
+
+        # Events are dispatched before their deadlines by the lookahead.
+        for now, deadline in moments:
+            assert abs(deadline - now - 0.1) < 1e-9
+        assert abs(moments[-1][1] - moments[0][1] - 1) < 1e-9
+
+    def test_loop(self):
+        clock = FakeClock(0)
+        scheduler = RealtimeScheduler(clock=clock, sleep=clock.sleep)
+        deadlines = []
+
+        def dispatch(i, deadline):
+            deadlines.append(deadline)
+            if len(deadlines) == 6:
+                scheduler.stop()
+
+        scheduler.run([0, 0.25, 0.5], dispatch, loop=True)
+        assert deadlines == [0, 0.25, 0.5, 0.5, 0.75, 1.0]
+
+    def test_stats(self):
+        stats = TimingStats(size=3)
+        for i in range(5):
+            stats.add(i, i * 0.001)
+        assert stats.count == 5
+        assert len(stats.lateness) == 3
+        assert abs(stats.drift - 0.002) < 1e-9
@@ -0,0 +1,71 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import mido
+import numpy as np
+
+from composition import Composition, Sequence
+from midiUtilities import write_to_file
+from note import NoteArray
+from timeIndex import NoteIndex
+
+
+def _composition(count=2000, seed=0):
+    random = np.random.default_rng(seed)
+    c = Composition()
+    c.add_track("a", 0)
+    c.add_track("b", 5)
+    for label in ("a", "b"):
+        notes = NoteArray(random.integers(40, 80, count), random.integers(1, 127, count),
+                          random.choice([1 / 16, 1 / 8, 1 / 4, 1, 4], count), random.choice([0, 1 / 16, 1 / 8], count),
+                          random.random(count) < 0.5)
+        c.add_sequence(Sequence(notes, label))
+    return c
+
+
+class TestNoteIndex(TestCase):
+    def test_sounding(self):
+        tracks = _composition().compile_events()
+        index = NoteIndex(tracks)
+        assert len(index) == 4000
+        for time in np.linspace(0, index.ends.max(), 50).tolist() + index.starts[::97].tolist():
+            expected = np.flatnonzero((index.starts <= time) & (index.ends > time))
+            assert index.sounding(time).tolist() == expected.tolist()
+            expected = np.flatnonzero((index.starts < time) & (index.ends > time))
+            assert index.sounding(time, include_onsets=False).tolist() == expected.tolist()
+
+    def test_slice(self):
+        tracks = _composition(200).compile_events()
+        index = NoteIndex(tracks)
+        start, end = 5.03, 11.5
+        sliced = index.slice(start, end)
+        assert [track.label for track in sliced] == ["a", "b"]
+
+        for track, original in zip(sliced, tracks):
+            events = track.events
+            assert events.time.min() >= 0 and events.time.max() <= end - start
+            assert np.count_nonzero(events.kind == 0x90) == np.count_nonzero(events.kind == 0x80)
+            # Notes sounding at the start begin at zero.
+            number = tracks.index(original)
+            sounding = index.sounding(start, include_onsets=False)
+            sounding = sounding[index.tracks[sounding] == number]
+            assert sorted(events.note[(events.time == 0) & (events.kind == 0x90)].tolist()) == \
+                   sorted(index.pitch[sounding].tolist() + index.pitch[(index.starts == start)
+                                                                       & (index.tracks == number)].tolist())
+
+        # The whole range gives the same notes.
+        for track, original in zip(index.slice(0), tracks):
+            assert sorted(zip(track.events.time.tolist(), track.events.note.tolist())) == \
+                   sorted(zip(original.events.time.tolist(), original.events.note.tolist()))
+
+    def test_write_range(self):
+        c = Composition()
+        c.add_track("a", 0)
+        c.add_sequence(Sequence.fromArrays([60, 62, 64], [64, 64, 64], [1, 1, 1], [0, 0, 0], [False] * 3, "a"))
+        for tracks in (c.compile_events(), c.compile_events(resolution=1920)):
+            with tempfile.TemporaryDirectory() as path:
+                write_to_file(tracks, path, bmp=120, ticks_per_beat=96, start=1.5, end=2.5)
+                midi = mido.MidiFile(os.path.join(path, "a.midi"))
+            messages = [(m.type, m.note, m.time) for m in midi.tracks[0] if m.type in ("note_on", "note_off")]
+            assert messages == [("note_on", 62, 0), ("note_off", 62, 192), ("note_on", 64, 0), ("note_off", 64, 192)]
@@ -0,0 +1,83 @@
+from unittest import TestCase
+
+import numpy as np
+
+from composition import Composition, Sequence
+from note import Note, NoteArray
+from transforms import humanize, scale_time, select, transpose, velocity_curve
+
+
+def _composition():
+    c = Composition()
+    c.add_track("a", 0)
+    c.add_track("b", 33)
+    notes = [Note(i, 4, velocity=40 + i, duration=1 / 8, delay=1 / 16, start_end=bool(i % 2)) for i in range(8)]
+    shared = Sequence(notes[:3], "b", delay=1 / 4)
+    s = c.add_sequence(Sequence(notes, "a"))
+    s += shared
+    s += Sequence([], "a")
+    s.next_sequences.append(Sequence(notes[::-1], "a", start_end=True).repeat(3, gap=1 / 8))
+    c.add_sequence(shared)
+    return c
+
+
+def _events(c, track):
+    return [(message.kind, message.time, message.note, message.velocity)
+            for id_track, message in c.iter_events() if id_track == track]
+
+
+class TestTransforms(TestCase):
+    def test_select(self):
+        c = _composition()
+        assert len(select(c)) == 4
+        assert [sequence.id_track for sequence in select(c, ["b"])] == ["b"]
+
+    def test_transpose(self):
+        c = _composition()
+        before = _events(c, "b")
+        transpose(c, 5, tracks=["a"])
+        assert _events(c, "b") == before
+        assert all(isinstance(sequence.notes, NoteArray) for sequence in select(c, ["a"]))
+        assert min(note for _, _, note, _ in _events(c, "a")) == 65
+        with self.assertRaises(ValueError):
+            transpose(c, 100)
+
+    def test_scale_time(self):
+        c = _composition()
+        c.set_tempo(90, 1 / 2)
+        before = c.compile_events()
+        seconds = [c.tempo_map(120).seconds(track.events.time) for track in before]
+        scale_time(c, 2)
+        # Tempo changes stay at the same notes, so every event takes twice as many seconds.
+        assert c.tempos == [(1, 90)]
+        for expected, actual, times in zip(before, c.compile_events(), seconds):
+            assert np.allclose(expected.events.time * 2, actual.events.time)
+            assert np.allclose(times * 2, c.tempo_map(120).seconds(actual.events.time))
+        scale_time(c, 3, tracks=["a"])
+        assert c.tempos == [(1, 90)]
+
+    def test_velocity_curve(self):
+        c = _composition()
+        velocity_curve(c, lambda v: v * 2, tracks=["b"])
+        assert sorted({velocity for _, _, _, velocity in _events(c, "b")}) == [80, 82, 84]
+        velocity_curve(c, [127] * 128)
+        assert {velocity for _, _, _, velocity in _events(c, "a")} == {127}
+
+    def test_humanize(self):
+        c = _composition()
+        before = c.compile_events()
+        humanize(c, timing=0, velocity=0, seed=1)
+        assert all(a.events == b.events for a, b in zip(before, c.compile_events()))
+
+        first, second = _composition(), _composition()
+        humanize(first, timing=1 / 64, velocity=5, seed=1)
+        humanize(second, timing=1 / 64, velocity=5, seed=1)
+        assert all(a.events == b.events for a, b in zip(first.compile_events(), second.compile_events()))
+
+        # Onsets deviate independently of each other, durations are kept.
+        for sequence, original in zip(select(first), select(_composition())):
+            starts, ends = sequence.toColumnar().onsets()
+            expected_starts, _ = original.toColumnar().onsets()
+            assert np.allclose(ends - starts, original.toColumnar().duration)
+            if len(starts):
+                assert starts.min() >= 0 and np.abs(starts - expected_starts).max() < 0.1
@@ -0,0 +1,162 @@
+"""
+Module for an interval index over notes of compiled tracks: which notes are sounding at a time
+and which notes fall into a time range, both in logarithmic time.
+"""
+from typing import List
+
+import numpy as np
+
+from midiUtilities import MidiTrack, MidiEvents, EventTrack, NOTE_ON, NOTE_OFF, track_events, track_resolution
+from note import to_tick
+
+
+class NoteIndex:
+    """
+    Notes (pairs of note_on and note_off) of tracks sorted by start time.
+    Notes are also grouped into buckets of similar durations (powers of two): a note sounding at a time
+    starts no earlier than the longest duration of its bucket before that time, so every bucket is
+    searched by a binary search over starts.
+    """
+
+    def __init__(self, tracks: List[MidiTrack | EventTrack]):
+        """
+        :param tracks: List of tracks with raw (absolute) times.
+        """
+        events = [track_events(track) for track in tracks]
+        numbers = np.repeat(np.arange(len(events)), [len(block) for block in events])
+        resolutions = {track_resolution(track) for track in tracks}
+        if len(resolutions) > 1:
+            raise ValueError("All tracks must have the same time units.")
+
+        self.labels = [track.label for track in tracks]
+        self.instruments = [track.instrument for track in tracks]
+        self.resolution = resolutions.pop() if resolutions else None
+        self._build(MidiEvents.concatenate(events), numbers)
+
+    @classmethod
+    def fromEvents(cls, events: MidiEvents, tracks) -> "NoteIndex":
+        """
+        Builds the index from events of several tracks in any time units (for example, seconds).
+
+        :param events: Events with absolute times.
+        :param tracks: Track number of every event.
+        :return: The NoteIndex.
+        """
+        index = object.__new__(cls)
+        index.resolution = None
+        count = int(np.max(tracks)) + 1 if len(events) else 0
+        index.labels = list(range(count))
+        index.instruments = [0] * count
+        index._build(events, np.asarray(tracks, dtype=np.int64))
+        return index
+
+    def _build(self, events: MidiEvents, tracks: np.ndarray):
+        # Every note_on is paired with the first free note_off of the same track and note.
+        on = np.flatnonzero(events.kind == NOTE_ON)
+        off = np.flatnonzero(events.kind == NOTE_OFF)
+        on = on[np.lexsort((events.time[on], events.note[on], tracks[on]))]
+        off = off[np.lexsort((events.time[off], events.note[off], tracks[off]))]
+        if len(on) != len(off) or np.any(events.note[on] != events.note[off]) or \
+                np.any(tracks[on] != tracks[off]) or np.any(events.time[off] < events.time[on]):
+            raise ValueError("Every note_on must have a later note_off of the same note.")
+
+        order = np.argsort(events.time[on], kind="stable")
+        on, off = on[order], off[order]
+        self.starts = events.time[on]
+        self.ends = events.time[off]
+        self.pitch = events.note[on]
+        self.velocity = events.velocity[on]
+        self.off_velocity = events.velocity[off]
+        self.tracks = tracks[on]
+
+        # List of tuples of the form: (indexes of notes, their starts, the longest duration).
+        self.buckets = []
+        durations = self.ends - self.starts
+        classes = np.frexp(durations.astype(np.float64))[1]
+        for value in np.unique(classes).tolist():
+            indexes = np.flatnonzero(classes == value)
+            self.buckets.append((indexes, self.starts[indexes], durations[indexes].max()))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def sounding(self, time, include_onsets: bool = True) -> np.ndarray:
+        """
+        Finds notes sounding at the time: start <= time < end.
+
+        :param time: The time.
+        :param include_onsets: Include notes that start exactly at the time or not (start < time).
+        :return: Sorted indexes of notes.
+        """
+        side = "right" if include_onsets else "left"
+        found = []
+        for indexes, starts, longest in self.buckets:
+            begin = np.searchsorted(starts, time - longest, side="right")
+            end = np.searchsorted(starts, time, side=side)
+            candidates = indexes[begin:end]
+            found.append(candidates[self.ends[candidates] > time])
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(found))
+
+    def overlapping(self, start, end) -> np.ndarray:
+        """
+        Finds notes that sound in the range [start, end): notes sounding at its start and notes starting in it.
+
+        :param start: The start of the range.
+        :param end: The end of the range.
+        :return: Sorted indexes of notes.
+        """
+        begin, stop = np.searchsorted(self.starts, [start, end], side="left")
+        return np.concatenate((self.sounding(start, include_onsets=False), np.arange(begin, stop)))
+
+    def musical_slice(self, start: float = None, end: float = None, rebase: bool = True) -> List[EventTrack]:
+        """
+        The same as slice, but the range is always in musical note duration (also for tracks with integer ticks).
+
+        :param start: The start of the range. If None, then from the beginning.
+        :param end: The end of the range. If None, then up to the end of the last note.
+        :param rebase: Move times so that the range starts at zero or keep absolute times.
+        :return: List of event tracks with raw times.
+        """
+        start = start or 0
+        if self.resolution is not None:
+            start = to_tick(start, self.resolution)
+            end = None if end is None else to_tick(end, self.resolution)
+        return self.slice(start, end, rebase=rebase)
+
+    def slice(self, start, end=None, rebase: bool = True) -> List[EventTrack]:
+        """
+        Cuts tracks to the range [start, end). Notes sounding at the start get note_on at the start,
+        notes sounding at the end get note_off at the end.
+
+        :param start: The start of the range.
+        :param end: The end of the range. If None, then up to the end of the last note.
+        :param rebase: Move times so that the range starts at zero or keep absolute times.
+        :return: List of event tracks with raw times (one per track of the index).
+        """
+        if end is None:
+            # After the end of the last note, so no note is cut.
+            end = self.ends.max() + 1 if len(self) else start
+        notes = self.overlapping(start, end)
+        starts = np.maximum(self.starts[notes], start)
+        ends = np.minimum(self.ends[notes], end)
+        if rebase:
+            starts, ends = starts - start, ends - start
+
+        time = np.empty(2 * len(notes), dtype=np.result_type(starts, ends))
+        time[0::2] = starts
+        time[1::2] = ends
+        kind = np.tile(np.array([NOTE_ON, NOTE_OFF], dtype=np.uint8), len(notes))
+        note = np.repeat(self.pitch[notes], 2)
+        velocity = np.empty(2 * len(notes), dtype=np.int16)
+        velocity[0::2] = self.velocity[notes]
+        velocity[1::2] = self.off_velocity[notes]
+        tracks = np.repeat(self.tracks[notes], 2)
+
+        result = []
+        for i, (label, instrument) in enumerate(zip(self.labels, self.instruments)):
+            mask = tracks == i
+            result.append(EventTrack(label, instrument, MidiEvents(time[mask], kind[mask], note[mask],
+                                                                   velocity[mask]), resolution=self.resolution))
+        return result
@@ -0,0 +1,172 @@
+"""
+Module for bulk transforms of compositions: transposition, time scaling, velocity curves and humanization.
+
+Notes of all selected sequences are gathered into one NoteArray, transformed in one vectorized pass
+and given back to the sequences as slices (selected sequences are converted to NoteArray).
+Every sequence is transformed once, even if it is reachable from several parents.
+"""
+from typing import Any, Callable, Iterable, List
+
+import numpy as np
+
+from composition import Composition, Sequence
+from note import NoteArray
+
+
+def select(composition: Composition, tracks: Iterable[Any] = None) -> List[Sequence]:
+    """
+    Finds all sequences of the composition (without recursion).
+
+    :param composition: The Composition.
+    :param tracks: Ids of tracks whose sequences are selected. If None, then all tracks.
+    :return: List of unique sequences.
+    """
+    tracks = None if tracks is None else set(tracks)
+    seen = set()
+    nodes = []
+    stack = list(reversed(composition.initial_sequences))
+    while stack:
+        sequence = stack.pop()
+        if id(sequence) in seen:
+            continue
+        seen.add(id(sequence))
+        nodes.append(sequence)
+        stack.extend(reversed(sequence.next_sequences))
+    return [sequence for sequence in nodes if tracks is None or sequence.id_track in tracks]
+
+
+def _apply(composition: Composition, tracks: Iterable[Any] | None,
+           transform: Callable[[NoteArray, np.ndarray], NoteArray]) -> List[Sequence]:
+    """
+    Gathers notes of selected sequences, transforms them and gives them back.
+
+    :param transform: Function of the form: transform(all notes, index of the first note of every sequence).
+    :return: Selected sequences.
+    """
+    sequences = select(composition, tracks)
+    arrays = [sequence.toColumnar() for sequence in sequences]
+    lengths = np.array([len(array) for array in arrays], dtype=np.int64)
+    firsts = np.cumsum(lengths) - lengths
+
+    notes = transform(NoteArray.concatenate(arrays), firsts)
+    for sequence, first, length in zip(sequences, firsts.tolist(), lengths.tolist()):
+        # Assigning notes invalidates compiled events of the sequence.
+        sequence.notes = notes[first:first + length]
+    return sequences
+
+
+def transpose(composition: Composition, semitones: int, tracks: Iterable[Any] = None) -> Composition:
+    """
+    Moves all notes of the tracks by a number of semitones.
+
+    :param composition: The Composition.
+    :param semitones: Number of semitones (negative - down).
+    :param tracks: Ids of tracks. If None, then all tracks.
+    :return: The same composition.
+    """
+    def transform(notes, firsts):
+        pitch = notes.pitch.astype(np.int64) + semitones
+        if len(pitch) and (pitch.min() < 0 or pitch.max() > 127):
+            raise ValueError("Transposed notes are out of the midi range 0..127.")
+        return NoteArray(pitch, notes.velocity, notes.duration, notes.delay, notes.start_end)
+
+    _apply(composition, tracks, transform)
+    return composition
+
+
+def scale_time(composition: Composition, factor: float, tracks: Iterable[Any] = None) -> Composition:
+    """
+    Multiplies durations and delays of notes and delays (and gaps of repeats) of sequences by a factor:
+    factor 2 plays the tracks twice as slow. Scaling only some tracks moves them relative to the others.
+    If all tracks are scaled, positions of tempo changes are scaled too, so they stay at the same notes.
+    Otherwise they are not changed, because tempo changes are shared by all tracks.
+
+    :param composition: The Composition.
+    :param factor: Positive factor.
+    :param tracks: Ids of tracks. If None, then all tracks.
+    :return: The same composition.
+    """
+    if factor <= 0:
+        raise ValueError("The factor must be positive.")
+    tracks = None if tracks is None else set(tracks)
+
+    def transform(notes, firsts):
+        return NoteArray(notes.pitch, notes.velocity, notes.duration * factor, notes.delay * factor, notes.start_end)
+
+    for sequence in _apply(composition, tracks, transform):
+        sequence.delay *= factor
+        sequence.gap *= factor
+    if tracks is None or tracks >= set(composition.tracks):
+        composition.tempos = [(position * factor, bmp) for position, bmp in composition.tempos]
+    return composition
+
+
+def velocity_curve(composition: Composition, curve: Callable[[np.ndarray], np.ndarray] | Iterable[int],
+                   tracks: Iterable[Any] = None) -> Composition:
+    """
+    Maps velocities of notes through a curve. Results are rounded and clipped to 1..127.
+
+    :param composition: The Composition.
+    :param curve: Vectorized function of velocities (for example, lambda v: 127 * (v / 127) ** 0.8)
+                  or a table of 128 new velocities.
+    :param tracks: Ids of tracks. If None, then all tracks.
+    :return: The same composition.
+    """
+    if callable(curve):
+        mapping = curve
+    else:
+        table = np.asarray(curve, dtype=np.float64)
+        if len(table) != 128:
+            raise ValueError("The velocity table must have 128 values.")
+        mapping = table.__getitem__
+
+    def transform(notes, firsts):
+        velocity = np.asarray(mapping(notes.velocity.clip(0, 127)), dtype=np.float64)
+        velocity = np.rint(velocity).clip(1, 127)
+        return NoteArray(notes.pitch, velocity, notes.duration, notes.delay, notes.start_end)
+
+    _apply(composition, tracks, transform)
+    return composition
+
+
+def humanize(composition: Composition, timing: float = 0, velocity: float = 0, seed: int = None,
+             tracks: Iterable[Any] = None) -> Composition:
+    """
+    Adds random deviations to onsets and velocities of notes. Onsets deviate independently
+    (errors do not accumulate along a sequence) and never move before the start of their sequence.
+
+    :param composition: The Composition.
+    :param timing: Standard deviation of onsets in musical note duration.
+    :param velocity: Standard deviation of velocities.
+    :param seed: Seed of the random generator. The same seed gives the same result.
+    :param tracks: Ids of tracks. If None, then all tracks.
+    :return: The same composition.
+    """
+    random = np.random.default_rng(seed)
+
+    def transform(notes, firsts):
+        count = len(notes)
+        result = NoteArray(notes.pitch, notes.velocity, notes.duration, notes.delay, notes.start_end)
+        if timing and count:
+            # Empty sequences share the first index with the next one.
+            firsts = np.unique(firsts[firsts < count])
+            # Onsets of all sequences in one pass: the cumulative sum restarts at the first note of every sequence.
+            steps = notes.delay.copy()
+            steps[1:] += notes.duration[:-1] * ~notes.start_end[1:]
+            steps[firsts] = notes.delay[firsts]
+            totals = np.cumsum(steps)
+            lengths = np.diff(np.append(firsts, count))
+            starts = totals - np.repeat(totals[firsts] - steps[firsts], lengths)
+
+            starts = np.maximum(starts + random.normal(0, timing, count), 0)
+            previous = np.empty(count)
+            previous[1:] = np.where(notes.start_end[1:], starts[:-1], starts[:-1] + notes.duration[:-1])
+            previous[firsts] = 0
+            result.delay = starts - previous
+        if velocity and count:
+            result.velocity = np.rint(notes.velocity + random.normal(0, velocity, count)).clip(1, 127) \
+                .astype(np.int16)
+        return result
+
+    _apply(composition, tracks, transform)
+    return composition